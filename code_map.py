@@ -7,10 +7,14 @@ code map showing classes, functions, methods, and their relationships.
 Supported: 165+ languages via tree-sitter-language-pack
 """
 
+import mmap
 import sys
 from pathlib import Path
-from typing import Dict, List, Set, Optional
-from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, Iterator, List, Set, Optional, Tuple
+from dataclasses import dataclass
+from collections import defaultdict
+
+from utils import get_matching_files
 
 try:
     from tree_sitter_language_pack import get_parser
@@ -21,7 +25,22 @@ except ImportError:
     sys.exit(1)
 
 
-@dataclass
+# Source files larger than this are parsed from a memory map, read in chunks of MMAP_READ_SIZE
+MMAP_THRESHOLD = 1 << 20
+MMAP_READ_SIZE = 1 << 16
+
+# Definition types that can contain methods
+CONTAINER_TYPES = {'class', 'struct', 'interface', 'enum', 'trait', 'module', 'protocol'}
+
+# Child node types holding the body of a container or function, and a function's parameters
+CONTAINER_BODY_TYPES = frozenset({'block', 'class_body', 'declaration_list', 'field_declaration_list', 'body'})
+FUNCTION_BODY_TYPES = frozenset({'block', 'body', 'statement_block', 'compound_statement'})
+PARAMS_NODE_TYPES = frozenset({'parameters', 'parameter_list', 'formal_parameters', 'parameter_declarations'})
+IDENTIFIER_TYPES = frozenset({'identifier', 'type_identifier'})
+NAME_NODE_TYPES = frozenset({'identifier', 'type_identifier', 'name'})
+
+
+@dataclass(slots=True)
 class Definition:
     """Represents a code definition (class, function, method, struct, interface, etc.)."""
     name: str
@@ -29,13 +48,13 @@ class Definition:
     start_line: int
     end_line: int
     file_path: str
-    params: List[str]
+    params: Tuple[str, ...]
     parent: Optional[str] = None  # For methods, the class/struct name
     id: Optional[str] = None
-    uses: Set[str] = field(default_factory=set)
+    uses: FrozenSet[str] = frozenset()
 
 
-@dataclass
+@dataclass(slots=True)
 class FileInfo:
     """Represents a file (code or non-code)."""
     path: str
@@ -59,7 +78,16 @@ class LanguageConfig:
         self.name = name
         self.extensions = extensions
         self.node_types = node_types
-        self.self_params = self_params or []
+        self.self_params = frozenset(self_params or ())
+
+        # Flat lookup from tree-sitter node type to (definition type, is_container).
+        # Containers take precedence over functions, as in the original classification order.
+        self.node_lookup: Dict[str, Tuple[str, bool]] = {}
+        for def_type, types in node_types.items():
+            is_container = def_type in CONTAINER_TYPES
+            for node_type in types:
+                if node_type not in self.node_lookup or (is_container and not self.node_lookup[node_type][1]):
+                    self.node_lookup[node_type] = (def_type, is_container)
 
 
 # Comprehensive language configurations
@@ -200,6 +228,41 @@ LANGUAGE_CONFIGS = {
     ),
 }
 
+# File extension -> language configuration (first configuration listing an extension wins)
+EXT_TO_CONFIG: Dict[str, LanguageConfig] = {}
+for _config in LANGUAGE_CONFIGS.values():
+    for _ext in _config.extensions:
+        EXT_TO_CONFIG.setdefault(_ext, _config)
+
+
+def iter_children(node: Node) -> Iterator[Node]:
+    """Yield the children of a node using a TreeCursor, without building the full children list."""
+    cursor = node.walk()
+    if cursor.goto_first_child():
+        yield cursor.node
+        while cursor.goto_next_sibling():
+            yield cursor.node
+
+
+def walk_descendants(node: Node, stop_types: Set[str] = frozenset()) -> Iterator[Node]:
+    """
+    Yield all descendants of a node in depth-first order using a TreeCursor.
+
+    Nodes whose type is in stop_types are yielded, but not descended into.
+    """
+    cursor = node.walk()
+    if not cursor.goto_first_child():
+        return
+    while True:
+        current = cursor.node
+        yield current
+        if current.type not in stop_types and cursor.goto_first_child():
+            continue
+        # Move to the next sibling of the nearest ancestor, until we're back at the start node
+        while not cursor.goto_next_sibling():
+            if not cursor.goto_parent():
+                return
+
 
 class CodeMapGenerator:
     """Generates code maps from source files in multiple languages."""
@@ -209,7 +272,7 @@ class CodeMapGenerator:
         self.directory = directory
         self.definitions: Dict[str, Definition] = {}
         self.file_infos: List[FileInfo] = []
-        self.top_level_uses: Dict[str, Set[str]] = {}  # file_path -> set of identifiers
+        self.top_level_uses: Dict[str, FrozenSet[str]] = {}  # file_path -> set of identifiers
         self.id_counter = 1
         self.parsers: Dict[str, any] = {}
 
@@ -230,13 +293,10 @@ class CodeMapGenerator:
         """
         Collect all files in the directory, respecting .gitignore.
         
-        Uses get_matching_files from tools module with .gitignore support.
+        Uses get_matching_files from the utils module with .gitignore support.
         """
-        # Import here to avoid circular dependency
-        import tools
-        
         # Get all files, respecting .gitignore
-        all_files = tools.get_matching_files(
+        all_files = get_matching_files(
             worktree_path=self.directory,
             include="**",
             exclude=[".git/**", ".claude/**"],
@@ -292,11 +352,7 @@ class CodeMapGenerator:
 
     def _detect_language(self, file_path: str) -> Optional[LanguageConfig]:
         """Detect the language of a file based on its extension."""
-        suffix = Path(file_path).suffix.lower()
-        for lang_name, config in LANGUAGE_CONFIGS.items():
-            if suffix in config.extensions:
-                return config
-        return None
+        return EXT_TO_CONFIG.get(Path(file_path).suffix.lower())
 
     def _get_definition_key(self, file_path: str, name: str, parent: Optional[str] = None) -> str:
         """Generate a unique key for a definition."""
@@ -304,67 +360,60 @@ class CodeMapGenerator:
             return f"{file_path}::{parent}.{name}"
         return f"{file_path}::{name}"
 
-    def _extract_identifier(self, node: Node) -> Optional[str]:
+    def _extract_identifier(self, node: Node, source: bytes) -> Optional[str]:
         """Extract identifier name from a node."""
         if node.type == 'identifier':
-            return node.text.decode('utf-8')
-
-        # Look for identifier in children
-        for child in node.children:
-            if child.type == 'identifier':
-                return child.text.decode('utf-8')
-            # Handle type_identifier (TypeScript, Go, etc.)
-            if child.type == 'type_identifier':
-                return child.text.decode('utf-8')
-            # Handle name field
-            if child.type == 'name':
-                return child.text.decode('utf-8')
+            return source[node.start_byte:node.end_byte].decode('utf-8')
+
+        # Look for identifier (or type_identifier for TypeScript, Go, etc., or name field) in children
+        for child in iter_children(node):
+            if child.type in NAME_NODE_TYPES:
+                return source[child.start_byte:child.end_byte].decode('utf-8')
 
         return None
 
-    def _extract_params(self, node: Node, lang_config: LanguageConfig) -> List[str]:
+    def _extract_params(self, node: Node, source: bytes, lang_config: LanguageConfig) -> Tuple[str, ...]:
         """Extract parameter names from a function/method definition."""
         params = []
 
         # Find the parameters node
         params_node = None
-        for child in node.children:
-            if child.type in ['parameters', 'parameter_list', 'formal_parameters', 'parameter_declarations']:
+        for child in iter_children(node):
+            if child.type in PARAMS_NODE_TYPES:
                 params_node = child
                 break
 
         if not params_node:
-            return params
+            return ()
 
         # Extract parameter identifiers
-        for child in params_node.children:
-            param_name = None
-
-            if child.type == 'identifier':
-                param_name = child.text.decode('utf-8')
-            elif child.type in ['parameter', 'parameter_declaration', 'formal_parameter']:
-                # Look for identifier in parameter
-                param_name = self._extract_identifier(child)
-            elif 'parameter' in child.type or 'param' in child.type:
-                param_name = self._extract_identifier(child)
-
-            if param_name and param_name not in lang_config.self_params:
+        self_params = lang_config.self_params
+        for child in iter_children(params_node):
+            child_type = child.type
+            if child_type == 'identifier':
+                param_name = source[child.start_byte:child.end_byte].decode('utf-8')
+            elif 'param' in child_type:
+                # parameter, parameter_declaration, formal_parameter, typed_parameter, etc.
+                param_name = self._extract_identifier(child, source)
+            else:
+                continue
+
+            if param_name and param_name not in self_params:
                 params.append(param_name)
 
-        return params
+        return tuple(params)
 
-    def _extract_identifiers(self, node: Node) -> Set[str]:
+    def _extract_identifiers(self, node: Node, source: bytes) -> FrozenSet[str]:
         """Extract all identifier names used in a node's body."""
-        identifiers = set()
-
-        def visit(n: Node):
-            if n.type in ['identifier', 'type_identifier']:
-                identifiers.add(n.text.decode('utf-8'))
-            for child in n.children:
-                visit(child)
+        # Collect the raw bytes first, so each distinct name is decoded only once
+        raw_names = set()
+        if node.type in IDENTIFIER_TYPES:
+            raw_names.add(source[node.start_byte:node.end_byte])
+        for n in walk_descendants(node):
+            if n.type in IDENTIFIER_TYPES:
+                raw_names.add(source[n.start_byte:n.end_byte])
 
-        visit(node)
-        return identifiers
+        return frozenset(name.decode('utf-8') for name in raw_names)
 
     def _parse_file(self, file_path: str, lang_config: LanguageConfig) -> None:
         """Parse a single source file and extract definitions."""
@@ -373,20 +422,31 @@ class CodeMapGenerator:
             return
 
         try:
-            source = (self.directory / file_path).read_bytes()
-            tree = parser.parse(source)
-            root = tree.root_node
-
-            self._extract_definitions(root, source, str(file_path), lang_config)
-            self._extract_top_level_uses(root, str(file_path), lang_config)
+            full_path = self.directory / file_path
+            if full_path.stat().st_size > MMAP_THRESHOLD:
+                # Parse large files straight from a memory map, instead of reading them into a bytes copy.
+                # Node text is sliced from the map as well (trees parsed from a callback carry no source).
+                with open(full_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as source:
+                    tree = parser.parse(lambda offset, point: source[offset:offset + MMAP_READ_SIZE])
+                    self._extract_from_tree(tree.root_node, source, str(file_path), lang_config)
+            else:
+                source = full_path.read_bytes()
+                tree = parser.parse(source)
+                self._extract_from_tree(tree.root_node, source, str(file_path), lang_config)
         except Exception as e:
             print(f"Warning: Failed to parse {file_path}: {e}", file=sys.stderr)
 
-    def _extract_top_level_uses(self, root: Node, file_path: str, lang_config: LanguageConfig) -> None:
+    def _extract_from_tree(self, root: Node, source: bytes, file_path: str, lang_config: LanguageConfig) -> None:
+        """Extract definitions and top-level uses from a parsed file."""
+        self._extract_definitions(root, source, file_path, lang_config)
+        self._extract_top_level_uses(root, source, file_path, lang_config)
+
+    def _extract_top_level_uses(self, root: Node, source: bytes, file_path: str, lang_config: LanguageConfig) -> None:
         """Extract identifier uses that are outside any function/class definition.
 
         Args:
             root: The root node of the AST
+            source: The source code the AST was parsed from
             file_path: Path to the file being parsed
             lang_config: Language configuration
         """
@@ -398,22 +458,17 @@ class CodeMapGenerator:
         top_level_identifiers = set()
 
         # Walk through root's children and extract identifiers from non-definition nodes
-        def extract_from_non_definitions(node: Node):
+        for top_node in iter_children(root):
             # If this is a definition node, skip it entirely
-            if node.type in definition_node_types:
-                return
+            if top_node.type in definition_node_types:
+                continue
 
-            # Otherwise, extract identifiers from this node
-            for child in node.children:
-                if child.type in ['identifier', 'type_identifier']:
-                    top_level_identifiers.add(child.text.decode('utf-8'))
-                # Recursively process children (but stop at definitions)
-                extract_from_non_definitions(child)
+            # Otherwise, extract identifiers from its descendants (but stop at definitions)
+            for node in walk_descendants(top_node, definition_node_types):
+                if node.type in IDENTIFIER_TYPES:
+                    top_level_identifiers.add(source[node.start_byte:node.end_byte].decode('utf-8'))
 
-        for child in root.children:
-            extract_from_non_definitions(child)
-
-        self.top_level_uses[file_path] = top_level_identifiers
+        self.top_level_uses[file_path] = frozenset(top_level_identifiers)
 
     def _extract_definitions(
         self,
@@ -423,116 +478,118 @@ class CodeMapGenerator:
         lang_config: LanguageConfig,
         parent_class: Optional[str] = None
     ) -> None:
-        """Recursively extract definitions from AST."""
-
-        # Check if this is a container type (class, struct, interface, etc.)
-        is_container = False
-        container_type = None
-        for def_type, node_types in lang_config.node_types.items():
-            if def_type in ['class', 'struct', 'interface', 'enum', 'trait', 'module', 'protocol']:
-                if node.type in node_types:
-                    is_container = True
-                    container_type = def_type
-                    break
-
-        if is_container:
-            name = self._extract_identifier(node)
-            body_node = None
-
-            # Find the body/block
-            for child in node.children:
-                if child.type in ['block', 'class_body', 'declaration_list', 'field_declaration_list', 'body']:
-                    body_node = child
-                    break
-
-            if name:
-                definition = Definition(
-                    name=name,
-                    type=container_type,
-                    start_line=node.start_point[0] + 1,
-                    end_line=node.end_point[0] + 1,
-                    file_path=file_path,
-                    params=[],
-                    parent=None
-                )
-                key = self._get_definition_key(file_path, name)
-                self.definitions[key] = definition
-
-                # Process body for methods
-                if body_node:
-                    self._extract_definitions(body_node, source, file_path, lang_config, parent_class=name)
-
-            return
+        """Extract definitions from AST, walking it depth-first with an explicit stack."""
+        stack = [(node, parent_class)]
+
+        while stack:
+            node, parent_class = stack.pop()
+
+            # Classify the node (container such as class/struct/interface, or function)
+            def_type, is_container = lang_config.node_lookup.get(node.type, (None, False))
+
+            if is_container:
+                name = self._extract_identifier(node, source)
+                body_node = None
+
+                # Find the body/block
+                for child in iter_children(node):
+                    if child.type in CONTAINER_BODY_TYPES:
+                        body_node = child
+                        break
+
+                if name:
+                    definition = Definition(
+                        name=name,
+                        type=def_type,
+                        start_line=node.start_point[0] + 1,
+                        end_line=node.end_point[0] + 1,
+                        file_path=file_path,
+                        params=(),
+                        parent=None
+                    )
+                    key = self._get_definition_key(file_path, name)
+                    self.definitions[key] = definition
+
+                    # Process body for methods
+                    if body_node:
+                        stack.append((body_node, name))
+
+                continue
 
-        # Check if this is a function/method
-        is_function = False
-        for def_type, node_types in lang_config.node_types.items():
             if def_type == 'function':
-                if node.type in node_types:
-                    is_function = True
-                    break
-
-        if is_function:
-            func_name = self._extract_identifier(node)
-            body_node = None
-
-            # Find the body/block
-            for child in node.children:
-                if child.type in ['block', 'body', 'statement_block', 'compound_statement']:
-                    body_node = child
-                    break
-
-            if func_name:
-                params = self._extract_params(node, lang_config)
-
-                definition = Definition(
-                    name=func_name,
-                    type='method' if parent_class else 'function',
-                    start_line=node.start_point[0] + 1,
-                    end_line=node.end_point[0] + 1,
-                    file_path=file_path,
-                    params=params,
-                    parent=parent_class
-                )
-                key = self._get_definition_key(file_path, func_name, parent_class)
-                self.definitions[key] = definition
-
-                # Extract identifiers used in the function body
-                if body_node:
-                    identifiers = self._extract_identifiers(body_node)
-                    definition.uses = identifiers
-
-            return
-
-        # Recursively process children for other node types
-        for child in node.children:
-            self._extract_definitions(child, source, file_path, lang_config, parent_class)
+                func_name = self._extract_identifier(node, source)
+                body_node = None
+
+                # Find the body/block
+                for child in iter_children(node):
+                    if child.type in FUNCTION_BODY_TYPES:
+                        body_node = child
+                        break
+
+                if func_name:
+                    params = self._extract_params(node, source, lang_config)
+
+                    definition = Definition(
+                        name=func_name,
+                        type='method' if parent_class else 'function',
+                        start_line=node.start_point[0] + 1,
+                        end_line=node.end_point[0] + 1,
+                        file_path=file_path,
+                        params=params,
+                        parent=parent_class
+                    )
+                    key = self._get_definition_key(file_path, func_name, parent_class)
+                    self.definitions[key] = definition
+
+                    # Extract identifiers used in the function body
+                    if body_node:
+                        identifiers = self._extract_identifiers(body_node, source)
+                        definition.uses = identifiers
+
+                continue
+
+            # Process children for other node types, pushed in reverse to keep source order
+            children = [(child, parent_class) for child in iter_children(node)]
+            children.reverse()
+            stack += children
 
     def _assign_ids_and_resolve_references(self) -> None:
-        """Assign IDs to definitions and resolve cross-references."""
-        # First pass: assign IDs
-        id_map = {}  # name -> id
+        """Assign IDs to definitions and resolve cross-references.
+
+        Names are resolved preferring a definition in the same file and parent (class, struct, etc.),
+        then one in the same file, and finally any definition with that name.
+        """
+        # First pass: assign IDs, indexing them by name globally, per file and per parent
+        global_ids: Dict[str, str] = {}  # name -> id
+        file_ids: Dict[Tuple[str, str], str] = {}  # (file_path, name) -> id
+        parent_ids: Dict[Tuple[str, str, str], str] = {}  # (file_path, parent, name) -> id
         for key, definition in self.definitions.items():
             definition.id = f"#{self.id_counter}"
-            id_map[definition.name] = definition.id
+            global_ids[definition.name] = definition.id
+            file_ids[(definition.file_path, definition.name)] = definition.id
+            if definition.parent:
+                parent_ids[(definition.file_path, definition.parent, definition.name)] = definition.id
             self.id_counter += 1
 
+        def resolve(identifiers: FrozenSet[str], file_path: str, parent: Optional[str]) -> FrozenSet[str]:
+            resolved = set()
+            # Set intersection with the known names skips unknown identifiers in one C-level operation
+            for name in identifiers & global_ids.keys():
+                resolved.add(
+                    parent_ids.get((file_path, parent, name))
+                    or file_ids.get((file_path, name))
+                    or global_ids[name]
+                )
+            return frozenset(resolved)
+
         # Second pass: resolve references in definitions
         for key, definition in self.definitions.items():
             if definition.uses:
-                resolved_uses = set()
-                for identifier in definition.uses:
-                    if identifier in id_map and identifier != definition.name:
-                        resolved_uses.add(id_map[identifier])
-                definition.uses = resolved_uses
+                definition.uses = resolve(definition.uses - {definition.name}, definition.file_path, definition.parent)
 
         # Third pass: resolve top-level uses to only include defined symbols
         for file_path, identifiers in self.top_level_uses.items():
-            resolved = set()
-            for identifier in identifiers:
-                if identifier in id_map:
-                    resolved.add(id_map[identifier])
-            self.top_level_uses[file_path] = resolved
+            self.top_level_uses[file_path] = resolve(identifiers, file_path, None)
 
     def generate_map(self) -> str:
         """Generate a code map for all files in the directory.
@@ -540,6 +597,14 @@ class CodeMapGenerator:
         Returns:
             String representation of the code map
         """
+        return "\n".join(self.iter_map_lines())
+
+    def iter_map_lines(self) -> Iterator[str]:
+        """Generate a code map for all files in the directory, yielding it line by line.
+
+        Yields:
+            Lines of the code map (without trailing newlines)
+        """
         # Collect all files first
         self._collect_all_files()
 
@@ -550,33 +615,32 @@ class CodeMapGenerator:
             if file_info.lines is not None:
                 lang_config = self._detect_language(file_info.path)
                 if lang_config:
-                    source_files.append(file_info.path)
+                    source_files.append((file_info.path, lang_config))
 
         # Parse source files for code structures
-        for file_path in source_files:
-            lang_config = self._detect_language(file_path)
-            if lang_config:
-                self._parse_file(file_path, lang_config)
+        for file_path, lang_config in source_files:
+            self._parse_file(file_path, lang_config)
 
         # Assign IDs and resolve references
         self._assign_ids_and_resolve_references()
 
         # Generate output
-        return self._format_output()
-
-    def _format_output(self) -> str:
-        """Format the definitions and file info into a readable code map."""
-        lines = []
-
-        # Group definitions by file
-        by_file: Dict[str, List[Definition]] = {}
+        yield from self._iter_output_lines()
+
+    def _iter_output_lines(self) -> Iterator[str]:
+        """Format the definitions and file info into a readable code map, one line at a time."""
+        # Group definitions by file in a single pass: containers and functions per file,
+        # methods per (file, container name)
+        containers_by_file: Dict[str, List[Definition]] = defaultdict(list)
+        functions_by_file: Dict[str, List[Definition]] = defaultdict(list)
+        methods_by_parent: Dict[Tuple[str, str], List[Definition]] = defaultdict(list)
         for definition in self.definitions.values():
-            if definition.file_path not in by_file:
-                by_file[definition.file_path] = []
-            by_file[definition.file_path].append(definition)
-
-        # Create file path -> FileInfo mapping
-        file_info_map = {fi.path: fi for fi in self.file_infos}
+            if definition.type in CONTAINER_TYPES:
+                containers_by_file[definition.file_path].append(definition)
+            elif definition.type == 'function':
+                functions_by_file[definition.file_path].append(definition)
+            elif definition.type == 'method':
+                methods_by_parent[(definition.file_path, definition.parent)].append(definition)
 
         # Sort files
         for file_info in sorted(self.file_infos, key=lambda f: f.path):
@@ -589,60 +653,59 @@ class CodeMapGenerator:
             if file_path_str in self.top_level_uses and self.top_level_uses[file_path_str]:
                 uses = sorted(self.top_level_uses[file_path_str])
                 uses_str = ' '.join(uses)
-                lines.append(f"{file_path_str} [{size_info}, uses {uses_str}]")
+                yield f"{file_path_str} [{size_info}, uses {uses_str}]"
             else:
-                lines.append(f"{file_path_str} [{size_info}]")
+                yield f"{file_path_str} [{size_info}]"
 
-            # If this file has code definitions, show them
-            if file_path_str in by_file:
-                definitions = by_file[file_path_str]
+            # Sort by line number
+            containers = sorted(containers_by_file.get(file_path_str, ()), key=lambda d: d.start_line)
+            functions = sorted(functions_by_file.get(file_path_str, ()), key=lambda d: d.start_line)
 
-                # Separate containers (classes, structs, etc.) and top-level functions
-                containers = [d for d in definitions if d.type in ['class', 'struct', 'interface', 'enum', 'trait', 'module', 'protocol']]
-                functions = [d for d in definitions if d.type == 'function']
+            # Output containers and their methods
+            for container in containers:
+                uses_str = f", uses {' '.join(sorted(container.uses))}" if container.uses else ""
+                yield f"  {container.id} {container.type} {container.name} [lines {container.start_line}-{container.end_line}{uses_str}]"
 
-                # Sort by line number
-                containers.sort(key=lambda d: d.start_line)
-                functions.sort(key=lambda d: d.start_line)
+                methods = sorted(methods_by_parent.get((file_path_str, container.name), ()), key=lambda d: d.start_line)
+                for method in methods:
+                    params_str = ", ".join(method.params) if method.params else ""
+                    uses_str = f", uses {' '.join(sorted(method.uses))}" if method.uses else ""
+                    yield f"    {method.id} method {method.name}({params_str}) [lines {method.start_line}-{method.end_line}{uses_str}]"
 
-                # Output containers and their methods
-                for container in containers:
-                    uses_str = f", uses {' '.join(sorted(container.uses))}" if container.uses else ""
-                    lines.append(f"  {container.id} {container.type} {container.name} [lines {container.start_line}-{container.end_line}{uses_str}]")
+            # Output top-level functions
+            for func in functions:
+                params_str = ", ".join(func.params) if func.params else ""
+                uses_str = f", uses {' '.join(sorted(func.uses))}" if func.uses else ""
+                yield f"  {func.id} function {func.name}({params_str}) [lines {func.start_line}-{func.end_line}{uses_str}]"
 
-                    # Find methods for this container
-                    methods = [d for d in definitions if d.type == 'method' and d.parent == container.name]
-                    methods.sort(key=lambda d: d.start_line)
 
-                    for method in methods:
-                        params_str = ", ".join(method.params) if method.params else ""
-                        uses_str = f", uses {' '.join(sorted(method.uses))}" if method.uses else ""
-                        lines.append(f"    {method.id} method {method.name}({params_str}) [lines {method.start_line}-{method.end_line}{uses_str}]")
+def generate_code_map(directory: str) -> str:
+    """Generate a code map for a software project.
 
-                # Output top-level functions
-                for func in functions:
-                    params_str = ", ".join(func.params) if func.params else ""
-                    uses_str = f", uses {' '.join(sorted(func.uses))}" if func.uses else ""
-                    lines.append(f"  {func.id} function {func.name}({params_str}) [lines {func.start_line}-{func.end_line}{uses_str}]")
+    Args:
+        directory: Path to the directory to scan
 
-        return "\n".join(lines)
+    Returns:
+        String representation of the code map
+    """
+    return "\n".join(iter_code_map_lines(directory))
 
 
-def generate_code_map(directory: str) -> str:
-    """Generate a code map for a software project.
+def iter_code_map_lines(directory: str) -> Iterator[str]:
+    """Generate a code map for a software project, line by line.
 
     Args:
         directory: Path to the directory to scan
 
     Returns:
-        String representation of the code map
+        Iterator over the lines of the code map (without trailing newlines)
     """
     dir_path = Path(directory)
     if not dir_path.exists():
         raise ValueError(f"Directory does not exist: {directory}")
-    
+
     generator = CodeMapGenerator(dir_path)
-    return generator.generate_map()
+    return generator.iter_map_lines()
 
 
 if __name__ == '__main__':
@@ -653,8 +716,9 @@ if __name__ == '__main__':
         directory = '.'
 
     try:
-        code_map = generate_code_map(directory)
-        print(code_map)
+        # Stream lines as they are formatted, rather than building the whole map in memory
+        for line in iter_code_map_lines(directory):
+            sys.stdout.write(line + '\n')
     except Exception as e:
         print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
@@ -1,10 +1,18 @@
 #!/usr/bin/env python3
 """Docker/Podman operations for safe command execution in containers."""
 
+import atexit
+import functools
+import os
+import selectors
+import signal
 import subprocess
+import sys
 import tempfile
 import shutil
+import threading
 import hashlib
+from collections import deque
 from pathlib import Path
 from typing import List, Dict, Optional
 
@@ -35,7 +43,7 @@ def get_container_runtime():
     return _CONTAINER_RUNTIME
 
 
-# Image cache to avoid rebuilding the same image
+# Image tags by (base image, RUN commands), to avoid rebuilding the same image
 _IMAGE_CACHE = {}
 
 
@@ -43,14 +51,21 @@ def build_image(base_image: str, docker_runs: List[str]) -> str:
     """Build a Docker image with the specified RUN commands, or return cached image ID."""
     runtime = get_container_runtime()
 
-    # Create a cache key from base image and runs
-    cache_key = hashlib.sha256(
-        f"{base_image}:{':'.join(docker_runs)}".encode()
-    ).hexdigest()[:12]
-
+    cache_key = (base_image, tuple(docker_runs))
     if cache_key in _IMAGE_CACHE:
         return _IMAGE_CACHE[cache_key]
 
+    # The tag is derived from the Dockerfile content, so an image built by an earlier run can be reused as is
+    digest = hashlib.blake2b(base_image.encode(), digest_size=6)
+    for run_cmd in docker_runs:
+        digest.update(b':')
+        digest.update(run_cmd.encode())
+    image_tag = f'maca-build-{digest.hexdigest()}'
+    result = subprocess.run([runtime, 'image', 'inspect', image_tag], capture_output=True)
+    if result.returncode == 0:
+        _IMAGE_CACHE[cache_key] = image_tag
+        return image_tag
+
     # Build the Dockerfile content
     dockerfile_content = f"FROM {base_image}\n"
     for run_cmd in docker_runs:
@@ -63,7 +78,6 @@ def build_image(base_image: str, docker_runs: List[str]) -> str:
         dockerfile_path.write_text(dockerfile_content)
 
         # Build the image
-        image_tag = f'maca-build-{cache_key}'
         cmd = [
             runtime, 'build',
             '-t', image_tag,
@@ -86,22 +100,203 @@ def build_image(base_image: str, docker_runs: List[str]) -> str:
     return image_tag
 
 
-def truncate_output(output: str, head: int, tail: int) -> str:
-    """Truncate output to keep only head and tail lines."""
-    lines = output.split('\n')
+# Containers kept running per (image, worktree), so that commands don't each pay for creating one
+_CONTAINERS = {}
+_containers_lock = threading.Lock()
+
+# Label on the containers started by maca, set to the process ID, so that containers left behind by a
+# killed process can be found (and removed) by the next run
+CONTAINER_LABEL = 'maca.pid'
+_stale_containers_removed = False
+
+# Messages with which docker and podman refuse to exec in a container that was stopped or removed
+_CONTAINER_GONE_MESSAGES = ('no such container', 'is not running', 'state improper')
+
+
+def _process_exists(pid: int) -> bool:
+    """Check whether a process with the given ID is running."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # Running, as another user
+    return True
+
+
+def _remove_stale_containers(runtime: str):
+    """Remove the containers left behind by maca processes that are no longer running."""
+    result = subprocess.run([runtime, 'ps', '--all', '--quiet', '--filter', f'label={CONTAINER_LABEL}'], capture_output=True, text=True)
+    container_ids = result.stdout.split()
+    if result.returncode != 0 or not container_ids:
+        return
+    result = subprocess.run(
+        [runtime, 'container', 'inspect', '--format', f'{{{{.Id}}}} {{{{index .Config.Labels "{CONTAINER_LABEL}"}}}}', *container_ids],
+        capture_output=True, text=True
+    )
+    stale = []
+    for line in result.stdout.splitlines():
+        container_id, _, pid = line.partition(' ')
+        if pid.isdigit() and not _process_exists(int(pid)):
+            stale.append(container_id)
+    if stale:
+        subprocess.run([runtime, 'rm', '--force', *stale], capture_output=True)
+
+
+def get_container(image: str, worktree_abs: Path, git_dir: Path) -> str:
+    """Start a long-running container for the image with the worktree mounted, or return the running one's ID."""
+    global _stale_containers_removed
+    runtime = get_container_runtime()
+    with _containers_lock:
+        key = (image, worktree_abs)
+        if key in _CONTAINERS:
+            return _CONTAINERS[key]
+
+        if not _stale_containers_removed:
+            _stale_containers_removed = True
+            _remove_stale_containers(runtime)
+
+        cmd = [
+            runtime, 'run',
+            '--detach',
+            '--rm',  # Remove container after it is stopped
+            '--label', f'{CONTAINER_LABEL}={os.getpid()}',
+            '-v', f'{worktree_abs}:{worktree_abs}',  # Mount worktree at same path
+            '-v', f'{git_dir}:{git_dir}:ro',  # Mount .git as read-only
+            image,
+            'tail', '-f', '/dev/null'  # Idle until stopped; commands are run with exec
+        ]
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise ContainerError(f"Failed to start container:\n{result.stderr}")
+
+        _CONTAINERS[key] = result.stdout.strip()
+        return _CONTAINERS[key]
+
+
+def _is_container_gone(runtime: str, container: str, stderr: str) -> bool:
+    """Check whether a failed exec failed because the container was stopped or removed."""
+    if not any(message in stderr.lower() for message in _CONTAINER_GONE_MESSAGES):
+        return False
+    # The command itself may print the same, so make sure
+    result = subprocess.run([runtime, 'container', 'inspect', '--format', '{{.State.Running}}', container], capture_output=True, text=True)
+    return result.returncode != 0 or result.stdout.strip() != 'true'
+
+
+def _evict_container(image: str, worktree_abs: Path, container: str):
+    """Forget a container that is gone, so that get_container starts a new one."""
+    with _containers_lock:
+        if _CONTAINERS.get((image, worktree_abs)) == container:
+            del _CONTAINERS[(image, worktree_abs)]
 
-    if len(lines) <= head + tail:
-        return output
 
-    stripped_count = len(lines) - head - tail
-    head_lines = lines[:head]
-    tail_lines = lines[-tail:] if tail > 0 else []
+@atexit.register
+def _remove_containers():
+    """Remove the long-running containers on exit."""
+    if _CONTAINERS:
+        subprocess.run([get_container_runtime(), 'rm', '--force', *_CONTAINERS.values()], capture_output=True)
+        _CONTAINERS.clear()
 
-    truncated = '\n'.join(head_lines)
-    truncated += f"\n\n... {stripped_count} more lines stripped (change head/tail to see them, or use grep to search for specific output) ...\n\n"
-    truncated += '\n'.join(tail_lines)
 
-    return truncated
+def _exit_on_signal(signum, frame):
+    """Exit like sys.exit does, so that the atexit handlers run and remove the containers."""
+    sys.exit(128 + signum)
+
+
+# Being terminated (or losing the terminal) skips the atexit handlers, unless handled
+for _signum in (signal.SIGTERM, getattr(signal, 'SIGHUP', None)):
+    if _signum is not None and signal.getsignal(_signum) == signal.SIG_DFL:
+        signal.signal(_signum, _exit_on_signal)
+
+
+class OutputLines:
+    """
+    The first `head` and last `tail` lines of a command's output, collected while it is read.
+
+    Memory use stays bounded regardless of the output size, and only the kept lines are decoded.
+    Lines are counted as by str.split('\n'), so the (possibly empty) last line counts as well.
+    """
+
+    def __init__(self, head: int, tail: int):
+        self.head = max(head, 0)
+        self.tail = max(tail, 0)
+        self.head_lines = []
+        self.tail_lines = deque(maxlen=self.tail)
+        self.count = 0  # Complete lines, not counting `partial`
+        self.partial = b''
+
+    def feed(self, data: bytes):
+        """Add a chunk of output."""
+        lines = (self.partial + data).split(b'\n')
+        self.partial = lines.pop()
+        self.count += len(lines)
+        room = self.head - len(self.head_lines)
+        if room > 0:
+            self.head_lines += lines[:room]
+            lines = lines[room:]
+        self.tail_lines.extend(lines)
+
+    def extend(self, other: 'OutputLines'):
+        """Append the output collected by another instance, as if the outputs were concatenated."""
+        skipped = other.count - len(other.head_lines) - len(other.tail_lines)
+        if skipped:
+            if other.head_lines:
+                self.feed(b'\n'.join(other.head_lines) + b'\n')
+            else:
+                self.partial = b''  # Continued by the first line, which is stripped
+            # Lines in between end up neither in the head (which is full now) nor in the tail
+            self.count += skipped
+            self.feed(b'\n'.join([*other.tail_lines, other.partial]))
+        else:
+            self.feed(b'\n'.join([*other.head_lines, *other.tail_lines, other.partial]))
+
+    def text(self) -> str:
+        """Get the output, with all but the head and tail lines stripped."""
+        lines = [*self.head_lines, *self.tail_lines, self.partial]
+        stripped_count = self.count + 1 - self.head - self.tail
+        if stripped_count <= 0:
+            return b'\n'.join(lines).decode(errors='replace')
+
+        tail_lines = lines[-self.tail:] if self.tail > 0 else []
+        truncated = b'\n'.join(self.head_lines[:self.head]).decode(errors='replace')
+        truncated += f"\n\n... {stripped_count} more lines stripped (change head/tail to see them, or use grep to search for specific output) ...\n\n"
+        truncated += b'\n'.join(tail_lines).decode(errors='replace')
+        return truncated
+
+
+@functools.cache
+def _resolve(path: Path) -> Path:
+    """Resolve a path, once per session (the worktree and repository paths don't change)."""
+    return path.resolve()
+
+
+def _exec_in_container(runtime: str, container: str, worktree_abs: Path, command: str, head: int, tail: int) -> tuple:
+    """Run a shell command in a running container, returning its stdout and stderr OutputLines and exit code."""
+    cmd = [
+        runtime, 'exec',
+        '-w', str(worktree_abs),  # Set working directory
+        container,
+        'sh', '-c', command
+    ]
+
+    # Execute the command, reading both pipes as output arrives and only keeping the head and
+    # tail lines, so verbose commands don't have their entire output buffered
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stdout = OutputLines(head, tail)
+    stderr = OutputLines(head, tail)
+    outputs = {process.stdout: stdout, process.stderr: stderr}
+    with selectors.DefaultSelector() as selector:
+        for pipe in outputs:
+            selector.register(pipe, selectors.EVENT_READ)
+        while selector.get_map():
+            for key, _ in selector.select():
+                data = os.read(key.fd, 65536)
+                if data:
+                    outputs[key.fileobj].feed(data)
+                else:
+                    selector.unregister(key.fileobj)
+                    key.fileobj.close()
+    return stdout, stderr, process.wait()
 
 
 def run_in_container(
@@ -114,7 +309,7 @@ def run_in_container(
     tail: int = 50
 ) -> Dict[str, any]:
     """
-    Execute a shell command in an ephemeral container.
+    Execute a shell command in the container for the image and worktree, starting it if needed.
 
     Args:
         command: The shell command to execute
@@ -140,38 +335,24 @@ def run_in_container(
         image = docker_image
 
     # Resolve absolute paths
-    worktree_abs = worktree_path.resolve()
-    repo_root_abs = repo_root.resolve()
+    worktree_abs = _resolve(worktree_path)
+    repo_root_abs = _resolve(repo_root)
     git_dir = repo_root_abs / '.git'
 
-    # Build the container run command
-    cmd = [
-        runtime, 'run',
-        '--rm',  # Remove container after exit
-        '-v', f'{worktree_abs}:{worktree_abs}',  # Mount worktree at same path
-        '-v', f'{git_dir}:{git_dir}:ro',  # Mount .git as read-only
-        '-w', str(worktree_abs),  # Set working directory
-        image,
-        'sh', '-c', command
-    ]
-
-    # Execute the command
-    result = subprocess.run(
-        cmd,
-        capture_output=True,
-        text=True
-    )
+    container = get_container(image, worktree_abs, git_dir)
+    stdout, stderr, exit_code = _exec_in_container(runtime, container, worktree_abs, command, head, tail)
+    if exit_code != 0 and _is_container_gone(runtime, container, stderr.text()):
+        # Stopped or removed outside of maca (e.g. by a runtime restart), so start a new one, once
+        _evict_container(image, worktree_abs, container)
+        container = get_container(image, worktree_abs, git_dir)
+        stdout, stderr, exit_code = _exec_in_container(runtime, container, worktree_abs, command, head, tail)
 
     # Combine stdout and stderr
-    combined_output = result.stdout
-    if result.stderr:
-        combined_output += result.stderr
-
-    # Truncate if necessary
-    truncated_output = truncate_output(combined_output, head, tail)
+    stdout.extend(stderr)
 
     return {
-        'stdout': truncated_output,
-        'stderr': result.stderr,
-        'exit_code': result.returncode
+        'stdout': stdout.text(),
+        # Truncated as well, as it ends up in the context in full otherwise
+        'stderr': stderr.text(),
+        'exit_code': exit_code
     }
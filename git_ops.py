@@ -1,14 +1,30 @@
 #!/usr/bin/env python3
 """Git operations for agentic coding assistant worktree management."""
 
+import os
 import subprocess
 import re
 from pathlib import Path
 
+try:
+    import pygit2
+except ImportError:
+    pygit2 = None
+
 from utils import C_GOOD, C_INFO, C_NORMAL, cprint
 
 ALWAYS_EXCLUDE = [':!.scratch', ':!.maca']
 
+# Open pygit2 repositories by path (only used when pygit2 is available)
+_repositories = {}
+
+# Per working tree path: its (git dir, common git dir) or None, and the last (HEAD signature, HEAD commit)
+_git_dirs = {}
+_head_cache = {}
+
+# A full object id (SHA-1 or SHA-256)
+OBJECT_ID_RE = re.compile(r'[0-9a-f]{40}(?:[0-9a-f]{24})?')
+
 
 class GitError(Exception):
     """Git operation failed."""
@@ -55,14 +71,156 @@ def get_repo_root(path='.'):
 
 def get_current_branch(cwd='.'):
     """Get the name of the current branch."""
+    # HEAD names the branch itself, so read it rather than forking git (which would read the same file)
+    dirs = _get_git_dirs(cwd)
+    if dirs:
+        head = (dirs[0] / 'HEAD').read_text()
+        if head.startswith('ref: refs/heads/'):
+            return head[16:].strip()
     result = run_git('rev-parse', '--abbrev-ref', 'HEAD', cwd=cwd)
     return result.stdout.strip()
 
 
+def _open_repository(path):
+    """Get a cached pygit2 repository for the given path."""
+    key = str(path)
+    repo = _repositories.get(key)
+    if repo is None:
+        repo = _repositories[key] = pygit2.Repository(key)
+    return repo
+
+
+def _find_git_dirs(path):
+    """
+    Find the git dir and the common git dir of a working tree root.
+
+    These are read from the files git uses to link them up (the '.git' file of a linked worktree
+    and the 'commondir' file in its git dir), only falling back to git itself for anything else.
+
+    Returns None for repositories that store their refs in a reftable (extensions.refStorage, which
+    creates a 'reftable' dir), as HEAD and the refs can't be read from files then.
+    """
+    dot_git = path / '.git'
+    content = dot_git.read_text() if dot_git.is_file() else ''
+    if dot_git.is_dir():
+        git_dir = common_dir = dot_git
+    elif content.startswith('gitdir: '):
+        git_dir = path / content[8:].strip()
+        commondir_file = git_dir / 'commondir'
+        common_dir = git_dir / commondir_file.read_text().strip() if commondir_file.exists() else git_dir
+    else:
+        git_dir, common_dir = run_git('rev-parse', '--absolute-git-dir', '--git-common-dir', cwd=path).stdout.split('\n')[:2]
+        git_dir, common_dir = Path(git_dir), path / common_dir
+    if (common_dir / 'reftable').is_dir():
+        return None
+    return git_dir, common_dir
+
+
+def _get_git_dirs(path):
+    """Get the (git dir, common git dir) of a working tree root (None for reftable repositories), cached per path."""
+    key = str(path)
+    if key not in _git_dirs:
+        _git_dirs[key] = _find_git_dirs(Path(path))
+    return _git_dirs[key]
+
+
+def _head_signature(path):
+    """
+    Get a signature of the files HEAD resolves through, which changes whenever HEAD moves.
+
+    Refs are replaced by renaming a new file over them, so the inode changes on every update,
+    even within the file system's timestamp granularity.
+    """
+    git_dir, common_dir = _get_git_dirs(path)
+
+    head = (git_dir / 'HEAD').read_text()
+    files = [git_dir / 'HEAD', common_dir / 'packed-refs']
+    if head.startswith('ref: '):
+        files.append(common_dir / head[5:].strip())
+
+    signature = [head]
+    for file in files:
+        try:
+            st = file.stat()
+            signature.append((st.st_ino, st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            signature.append(None)
+    return tuple(signature)
+
+
+def _read_head_file(path, head):
+    """
+    Resolve HEAD from its file contents, following a symbolic ref to its loose ref file, or to its
+    entry in packed-refs.
+
+    Returns None when that doesn't give an object id (e.g. a ref pointing at another ref).
+    """
+    if head.startswith('ref: '):
+        ref = head[5:].strip()
+        common_dir = _get_git_dirs(path)[1]
+        try:
+            head = (common_dir / ref).read_text()
+        except FileNotFoundError:
+            head = _read_packed_ref(common_dir, ref)
+            if head is None:
+                return None
+    head = head.strip()
+    return head if OBJECT_ID_RE.fullmatch(head) else None
+
+
+def _read_packed_ref(common_dir, ref):
+    """Get the object id of a ref from packed-refs ('<object id> <ref>' lines), or None."""
+    suffix = ' ' + ref
+    try:
+        with open(common_dir / 'packed-refs') as file:
+            for line in file:
+                line = line.rstrip('\n')
+                if line.endswith(suffix):
+                    return line[:-len(suffix)]
+    except FileNotFoundError:
+        pass
+    return None
+
+
 def get_head_commit(cwd='.'):
     """Get the current HEAD commit hash."""
-    result = run_git('rev-parse', 'HEAD', cwd=cwd)
-    return result.stdout.strip()
+    # Neither the files nor libgit2 can be read for reftable repositories
+    if _get_git_dirs(cwd) is None:
+        return run_git('rev-parse', 'HEAD', cwd=cwd).stdout.strip()
+
+    if pygit2:
+        # Read HEAD in-process instead of forking git on every turn
+        try:
+            return str(_open_repository(cwd).head.target)
+        except pygit2.GitError as e:
+            raise GitError(f"Could not resolve HEAD in {cwd}: {e}")
+
+    # Only reread when one of the files HEAD resolves through has changed since the last call
+    signature = _head_signature(cwd)
+    cached = _head_cache.get(str(cwd))
+    if cached and cached[0] == signature:
+        return cached[1]
+    commit = _read_head_file(cwd, signature[0])
+    if commit is None:
+        commit = run_git('rev-parse', 'HEAD', cwd=cwd).stdout.strip()
+    _head_cache[str(cwd)] = (signature, commit)
+    return commit
+
+
+def get_merge_base(commit_a, commit_b, cwd='.'):
+    """Get the best common ancestor of two commits (or branch names)."""
+    if pygit2 and _get_git_dirs(cwd) is not None:
+        # Computed in-process, like HEAD
+        try:
+            repo = _open_repository(cwd)
+            base = repo.merge_base(repo.revparse_single(commit_a).id, repo.revparse_single(commit_b).id)
+        except (pygit2.GitError, KeyError) as e:
+            raise GitError(f"Could not find merge base of {commit_a} and {commit_b} in {cwd}: {e}")
+        if base is None:
+            raise GitError(f"{commit_a} and {commit_b} have no common ancestor in {cwd}")
+        return str(base)
+
+    return run_git('merge-base', commit_a, commit_b, cwd=cwd).stdout.strip()
 
 
 # def get_commits_between(old_commit, new_commit, cwd='.'):
@@ -109,13 +267,15 @@ def find_next_session_id(repo_root):
     maca_dir = Path(repo_root) / '.maca'
     maca_dir.mkdir(exist_ok=True)
 
-    # Find all existing session directories
-    existing = []
-    for item in maca_dir.iterdir():
-        if item.is_dir() and item.name.isdigit():
-            existing.append(int(item.name))
+    # Find the highest existing session directory. Directory entries carry their file type, so
+    # (unlike Path.is_dir) this needs no stat per entry.
+    last_id = 0
+    with os.scandir(maca_dir) as entries:
+        for entry in entries:
+            if entry.name.isdigit() and entry.is_dir():
+                last_id = max(last_id, int(entry.name))
 
-    return max(existing, default=0) + 1
+    return last_id + 1
 
 
 def create_session_worktree(repo_root, session_id):
@@ -204,7 +364,7 @@ def merge_to_main(root_path, worktree_path, org_branch_name, commit_message):
     run_git('checkout', '-b', descriptive_branch, cwd=worktree_path, check=False) # May err if we rerun after rebase conflict
 
     # Get the merge base
-    base_commit = run_git('merge-base', root_branch, worktree_branch, cwd=worktree_path).stdout.strip()
+    base_commit = get_merge_base(root_branch, worktree_branch, cwd=worktree_path)
 
     # Append preservation note to commit message
     enhanced_message = commit_message.rstrip() + f'\n\nThe original chain of MACA commits is kept in the {descriptive_branch} branch.'
@@ -240,6 +400,9 @@ def cleanup_session(repo_root, worktree_path, branch_name):
     """Clean up the worktree and branch after merge."""
     # Remove worktree
     run_git('worktree', 'remove', str(worktree_path), cwd=repo_root, check=False)
+    _repositories.pop(str(worktree_path), None)
+    _git_dirs.pop(str(worktree_path), None)
+    _head_cache.pop(str(worktree_path), None)
 
     # Delete branch
     run_git('branch', '-D', branch_name, cwd=repo_root, check=False)
@@ -1,19 +1,58 @@
 """LLM API interaction and streaming."""
 
 from typing import List, Dict, Any, Optional
+import atexit
+import codecs
 import json
-import urllib.request
+import http.client
 import time
 import re
 import os
+import selectors
+import ssl
 import sys
+import threading
+import zlib
 
 from logger import log
-from utils import cprint, C_INFO, C_BAD
+from utils import cprint, json_dumps_bytes, json_loads, C_INFO, C_BAD
 
 
-# Global cumulative cost tracking
+# Matches a JSON number literal (used when scanning partial tool-call arguments)
+_JSON_NUMBER_RE = re.compile(r'-?(0|[1-9]\d*)(\.\d+)?([eE][+-]?\d+)?')
+_JSON_NUMBER_CHARS = frozenset('0123456789.eE+-')
+
+# OpenRouter chat completions endpoint
+OPENROUTER_HOST = 'openrouter.ai'
+OPENROUTER_PATH = '/api/v1/chat/completions'
+
+# Socket timeouts (seconds) for connecting, and for each read of the streamed response (a slow model
+# may legitimately take a while, while an unreachable host should fail fast and be retried)
+OPENROUTER_CONNECT_TIMEOUT = 10
+OPENROUTER_TIMEOUT = 300
+
+# HTTP statuses worth retrying (rate limiting, server side errors), and the backoff base delay (seconds)
+RETRY_STATUSES = frozenset((408, 429, 500, 502, 503, 504))
+RETRY_BACKOFF = 0.5
+
+# Model families that only cache the prompt up to explicit cache_control breakpoints. Other providers
+# cache matching prefixes by themselves, so the history is sent to them exactly as stored.
+CACHE_CONTROL_MODELS = ('anthropic/', 'google/gemini')
+
+# Idle persistent (keep-alive) HTTPS connections to OpenRouter, reused across LLM calls. Concurrent
+# calls (from sub-processors running in parallel) each take their own connection from the pool.
+# Beyond MAX_IDLE_CONNECTIONS, released connections are closed.
+MAX_IDLE_CONNECTIONS = 8
+_idle_connections: List[http.client.HTTPSConnection] = []
+_pool_lock = threading.Lock()
+
+# Encoded request body prefixes, keyed by model and the ids of the tool schema dicts. The cache entry
+# keeps the (constant, never mutated) schema dicts alive, so their ids can't be reused by other objects.
+_body_prefix_cache: Dict[tuple, tuple] = {}
+
+# Global cumulative cost tracking (also guards the debug response index)
 _cumulative_cost = 0
+_cost_lock = threading.Lock()
 
 # Debug/testing support
 _debug_llm_responses = None
@@ -26,6 +65,209 @@ if not api_key:
     cprint(C_BAD, 'Error: OPENROUTER_API_KEY environment variable not set')
     sys.exit(1)
 
+# Request headers are the same for every call
+_HEADERS = {
+    'Content-Type': 'application/json',
+    'Accept-Encoding': 'gzip',
+    'Authorization': f'Bearer {api_key}',
+    'HTTP-Referer': 'https://github.com/vanviegen/maca',
+    'X-Title': 'MACA - Multi-Agent Coding Assistant'
+}
+
+
+def with_cache_control(message: Dict) -> Dict:
+    """Return a copy of a message with an ephemeral cache control marker on its (last) content block."""
+    content = message['content']
+    if isinstance(content, list):
+        content = content[:-1] + [{**content[-1], 'cache_control': {'type': 'ephemeral'}}]
+    elif isinstance(content, dict):
+        content = {**content, 'cache_control': {'type': 'ephemeral'}}
+    else:
+        content = [{'type': 'text', 'text': content, 'cache_control': {'type': 'ephemeral'}}]
+    return {**message, 'content': content}
+
+
+class LLMHTTPError(Exception):
+    """OpenRouter responded with a non-200 status (the response body has been fully read)."""
+
+    def __init__(self, message: str, status: int, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+def _release_connection(connection: http.client.HTTPSConnection):
+    """Return a connection whose response has been fully read to the pool."""
+    with _pool_lock:
+        if len(_idle_connections) < MAX_IDLE_CONNECTIONS:
+            _idle_connections.append(connection)
+            return
+    connection.close()
+
+
+@atexit.register
+def _close_idle_connections():
+    """Close the pooled connections on exit, rather than leaving them to the server's idle timeout."""
+    with _pool_lock:
+        while _idle_connections:
+            _idle_connections.pop().close()
+
+
+def _is_dropped(connection: http.client.HTTPSConnection) -> bool:
+    """
+    Check whether an idle pooled connection has been closed by the server.
+
+    No response data is expected on an idle connection, but its socket can still become readable
+    without it being closed: a TLS 1.3 server sends its session tickets after the handshake. So
+    readable sockets are read from without blocking. TLS records that carry no application data
+    leave nothing to read, while a connection closed by the server reads as EOF.
+    """
+    sock = connection.sock
+    if sock is None:
+        return True
+    with selectors.DefaultSelector() as selector:
+        selector.register(sock, selectors.EVENT_READ)
+        if not selector.select(0):
+            return False
+    timeout = sock.gettimeout()
+    sock.settimeout(0)
+    try:
+        sock.recv(1)  # EOF, or (unexpected) data that would garble the next response
+        return True
+    except (ssl.SSLWantReadError, BlockingIOError):
+        return False
+    except OSError:
+        return True
+    finally:
+        sock.settimeout(timeout)
+
+
+def _open_connection() -> http.client.HTTPSConnection:
+    """Open a new HTTPS connection to OpenRouter, waiting at most OPENROUTER_CONNECT_TIMEOUT for it."""
+    connection = http.client.HTTPSConnection(OPENROUTER_HOST, timeout=OPENROUTER_CONNECT_TIMEOUT)
+    connection.connect()
+    connection.sock.settimeout(OPENROUTER_TIMEOUT)
+    return connection
+
+
+def _prewarm():
+    try:
+        _release_connection(_open_connection())
+    except OSError:
+        pass  # The next call connects (and retries) by itself
+
+
+def prewarm_connection():
+    """
+    Make sure a live pooled connection will be available for the next LLM call.
+
+    When the pool has none (e.g. the server closed them during a long tool run), a connection is
+    opened in the background, so its TCP and TLS handshakes overlap with the tool work.
+    """
+    if _debug_llm_responses is not None:
+        return
+    with _pool_lock:
+        for connection in [c for c in _idle_connections if _is_dropped(c)]:
+            _idle_connections.remove(connection)
+            connection.close()
+        if _idle_connections:
+            return
+    threading.Thread(target=_prewarm, daemon=True).start()
+
+
+def _post(body: bytes, headers: Dict[str, str]) -> tuple[http.client.HTTPSConnection, http.client.HTTPResponse]:
+    """
+    POST a request body to OpenRouter over a pooled persistent connection.
+
+    Pooled connections that the server has closed in the meantime (idle keep-alive timeout) are
+    skipped. If a reused connection turns out to have been closed anyway, the request is
+    transparently retried over a fresh connection. The caller must hand the returned connection
+    back with _release_connection once the response has been read, or close it.
+    """
+    while True:
+        with _pool_lock:
+            connection = _idle_connections.pop() if _idle_connections else None
+        reused = connection is not None
+        if reused and _is_dropped(connection):
+            connection.close()
+            continue
+        if not reused:
+            connection = _open_connection()
+        try:
+            connection.request('POST', OPENROUTER_PATH, body=body, headers=headers)
+            return connection, connection.getresponse()
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            connection.close()
+            if not reused:
+                raise
+
+
+def _get_body_prefix(model: str, tool_schemas: List[Dict[str, Any]]) -> bytes:
+    """
+    Return the encoded request body up to the messages array, which is all that changes between calls.
+
+    Each distinct model/tool schemas combination is only serialized once.
+    """
+    key = (model, *map(id, tool_schemas))
+    entry = _body_prefix_cache.get(key)
+    if entry is None:
+        data = {
+            'model': model,
+            'tools': tool_schemas,
+            'usage': {"include": True},
+            'tool_choice': 'required',
+            'stream': True,
+            'streamOptions': {'includeUsage': True},
+            # 'reasoning': {
+            #     'effort': 'medium'
+            # }
+        }
+        # Leave the object open, for the messages to be appended
+        entry = _body_prefix_cache[key] = (tuple(tool_schemas), json_dumps_bytes(data)[:-1] + b',"messages":')
+    return entry[1]
+
+
+class MessageEncoder:
+    """
+    Encodes message lists for request bodies, remembering the encoding of each message.
+
+    A conversation is resent in full on every turn, while only a few of its messages are new, so
+    each message only needs to be serialized once. Messages must not be mutated after being encoded.
+    """
+
+    def __init__(self):
+        # Encoded messages by id. Entries keep their message alive, so ids can't be reused.
+        self._cache: Dict[int, tuple] = {}
+
+    def encoded_size(self, message: Dict[str, Any]) -> int:
+        """Return the length of a message's encoding, which is kept for the next encode call."""
+        entry = self._cache.get(id(message))
+        if entry is None:
+            entry = self._cache[id(message)] = (message, json_dumps_bytes(message))
+        return len(entry[1])
+
+    def encode(self, messages: List[Dict[str, Any]], prefix: bytes = b'', suffix: bytes = b'') -> bytes:
+        """
+        Return the JSON encoding of a list of messages, between prefix and suffix.
+
+        The result is assembled with a single join, as it can be large and is built on every turn.
+        """
+        previous, self._cache = self._cache, {}
+        parts = [prefix, b'[']
+        for message in messages:
+            entry = previous.get(id(message)) or self._cache.get(id(message))
+            if entry is None:
+                entry = (message, json_dumps_bytes(message))
+            # Only messages that are still being sent are remembered
+            self._cache[id(message)] = entry
+            parts.append(entry[1])
+            parts.append(b',')
+        if messages:
+            parts.pop()
+        parts.append(b']')
+        parts.append(suffix)
+        return b''.join(parts)
+
 
 class LLMStreamReader:
     """Reads and processes streaming responses from the LLM API."""
@@ -35,15 +277,26 @@ class LLMStreamReader:
         self.message = None
         self.usage = None
         self._partial_arg_json = ""
+        self._partial_arg_index = 0
+        self._reset_scan()
     
     def process_chunk(self, chunk_str: str):
         """Process a chunk of streaming data."""
-        self.buffer += chunk_str
-        
-        while '\n' in self.buffer:
-            line_end = self.buffer.find('\n')
-            line = self.buffer[:line_end].strip()
-            self.buffer = self.buffer[line_end + 1:]
+        # Fast path: no complete line yet, so there is nothing to parse
+        if '\n' not in chunk_str:
+            self.buffer += chunk_str
+            return
+
+        # Split off all complete lines at once, keeping the trailing partial line buffered
+        complete, _, self.buffer = (self.buffer + chunk_str).rpartition('\n')
+
+        # Argument deltas of this chunk, by tool call. Appending each (often token-sized) delta to the
+        # arguments string right away would copy the whole string every time, as it lives in a dict.
+        pending_arguments: Dict[int, List[str]] = {}
+        last_index = None
+
+        for line in complete.split('\n'):
+            line = line.strip()
             
             if not line or line.startswith(':'):
                 continue
@@ -54,7 +307,7 @@ class LLMStreamReader:
                     break
                 
                 try:
-                    data_obj = json.loads(data_str)
+                    data_obj = json_loads(data_str)
                     delta = data_obj.get('choices', [{}])[0].get('delta', {})
 
                     # Handle text content
@@ -90,87 +343,132 @@ class LLMStreamReader:
                                 if 'name' in tool_call_delta['function']:
                                     tc['function']['name'] = tool_call_delta['function']['name']
                                 if 'arguments' in tool_call_delta['function']:
-                                    tc['function']['arguments'] += tool_call_delta['function']['arguments']
-                                    self._partial_arg_json = tc['function']['arguments']
+                                    pending_arguments.setdefault(idx, []).append(tool_call_delta['function']['arguments'])
+                                    last_index = idx
 
                     if 'usage' in data_obj:
                         self.usage = data_obj['usage']
                 
                 except json.JSONDecodeError:
                     pass
+
+        for idx, parts in pending_arguments.items():
+            self.message['tool_calls'][idx]['function']['arguments'] += ''.join(parts)
+        if last_index is not None:
+            if last_index != self._partial_arg_index:
+                self._partial_arg_index = last_index
+                self._reset_scan()
+            self._partial_arg_json = self.message['tool_calls'][last_index]['function']['arguments']
     
+    def _reset_scan(self):
+        """Forget the scan state of _find_truncation_point (when starting on a new arguments string)."""
+        self._scan_pos = 0
+        self._scan_stack = []
+        self._scan_string_start = None
+
     def _find_truncation_point(self, json_str: str) -> List[str]:
-        """Find the path to the current field being written in truncated JSON."""
-        path, i = [], 0
-        
-        while i < len(json_str) and json_str[i].isspace():
+        """
+        Find the path to the current field being written in truncated JSON.
+
+        As json_str only grows while streaming, scanning resumes where the previous call left off
+        instead of starting over, which keeps the total work linear in the length of the arguments.
+        A trailing token that may still be incomplete (a number, or a string that may turn out to
+        be a key) is scanned again on the next call.
+        """
+        i, stack, start = self._scan_pos, self._scan_stack, self._scan_string_start
+        n = len(json_str)
+        # Set when the incomplete trailing token would complete the value of the current key
+        pop_tail = False
+
+        while True:
+            if start is None:
+                while i < n and json_str[i].isspace():
+                    i += 1
+                if i >= n:
+                    break
+
+                c = json_str[i]
+                if c == '"':
+                    start = i
+                    i += 1
+                elif c == '{':
+                    i += 1
+                    continue
+                elif c == '[':
+                    stack.append(('arr', 0))
+                    i += 1
+                    continue
+                elif c == ']':
+                    if stack and stack[-1][0] == 'arr':
+                        stack.pop()
+                    i += 1
+                    continue
+                elif c == '}':
+                    if stack and stack[-1][0] == 'obj':
+                        stack.pop()
+                    i += 1
+                    continue
+                elif c == ',':
+                    if stack and stack[-1][0] == 'arr':
+                        stack[-1] = ('arr', stack[-1][1] + 1)
+                    elif stack and stack[-1][0] == 'obj':
+                        stack.pop()
+                    i += 1
+                    continue
+                elif c == '-' or '0' <= c <= '9':
+                    m = _JSON_NUMBER_RE.match(json_str, i)
+                    k = i + 1
+                    while k < n and json_str[k] in _JSON_NUMBER_CHARS:
+                        k += 1
+                    if k >= n:
+                        # The number may continue in the next chunk
+                        pop_tail = stack and stack[-1][0] == 'obj'
+                        break
+                    i += len(m.group(0)) if m else 1
+                    if stack and stack[-1][0] == 'obj':
+                        stack.pop()
+                    continue
+                elif json_str[i:i+4] in ('true', 'null') or json_str[i:i+5] == 'false':
+                    i += 4 if json_str[i] == 't' or json_str[i] == 'n' else 5
+                    if stack and stack[-1][0] == 'obj':
+                        stack.pop()
+                    continue
+                elif n - i < 5 and ('true'.startswith(json_str[i:]) or 'null'.startswith(json_str[i:]) or 'false'.startswith(json_str[i:])):
+                    # A literal that is still being received
+                    break
+                else:
+                    i += 1
+                    continue
+
+            # Inside a string (possibly resumed from a previous call)
+            while i < n and json_str[i] != '"':
+                i += 2 if json_str[i] == '\\' else 1
+            if i >= n:
+                if i > n:
+                    # Resume at the trailing backslash, as its escaped character is yet to come
+                    i = n - 1
+                break
             i += 1
-        
-        if i >= len(json_str):
-            return path
-        
-        stack = []
-        
-        while i < len(json_str):
-            while i < len(json_str) and json_str[i].isspace():
-                i += 1
-            if i >= len(json_str):
+
+            # Check if this is a key
+            j = i
+            while j < n and json_str[j].isspace():
+                j += 1
+            if j >= n:
+                # Can't tell yet: rescan from the closing quote next time
+                i -= 1
+                pop_tail = stack and stack[-1][0] == 'obj'
                 break
-                
-            c = json_str[i]
-            
-            if c == '"':
-                start = i
-                i += 1
-                while i < len(json_str) and json_str[i] != '"':
-                    i += 2 if json_str[i] == '\\' else 1
-                if i >= len(json_str):
-                    break
-                i += 1
-                
-                # Check if this is a key
-                j = i
-                while j < len(json_str) and json_str[j].isspace():
-                    j += 1
-                if j < len(json_str) and json_str[j] == ':':
-                    key = json_str[start+1:i-1].replace('\\"', '"').replace('\\\\', '\\')
-                    i = j + 1
-                    stack.append(('obj', key))
-                elif stack and stack[-1][0] == 'obj':
-                    stack.pop()
-                    
-            elif c == '{':
-                i += 1
-            elif c == '[':
-                stack.append(('arr', 0))
-                i += 1
-            elif c == ']':
-                if stack and stack[-1][0] == 'arr':
-                    stack.pop()
-                i += 1
-            elif c == '}':
-                if stack and stack[-1][0] == 'obj':
-                    stack.pop()
-                i += 1
-            elif c == ',':
-                if stack and stack[-1][0] == 'arr':
-                    stack[-1] = ('arr', stack[-1][1] + 1)
-                elif stack and stack[-1][0] == 'obj':
-                    stack.pop()
-                i += 1
-            elif re.match(r'[-0-9]', c):
-                m = re.match(r'-?(0|[1-9]\d*)(\.\d+)?([eE][+-]?\d+)?', json_str[i:])
-                i += len(m.group(0)) if m else 1
-                if stack and stack[-1][0] == 'obj':
-                    stack.pop()
-            elif json_str[i:i+4] in ('true', 'null') or json_str[i:i+5] == 'false':
-                i += 4 if json_str[i] == 't' or json_str[i] == 'n' else 5
-                if stack and stack[-1][0] == 'obj':
-                    stack.pop()
-            else:
-                i += 1
-        
-        return [x[1] for x in stack]
+            if json_str[j] == ':':
+                key = json_str[start+1:i-1].replace('\\"', '"').replace('\\\\', '\\')
+                i = j + 1
+                stack.append(('obj', key))
+            elif stack and stack[-1][0] == 'obj':
+                stack.pop()
+            start = None
+
+        self._scan_pos, self._scan_string_start = i, start
+        return [x[1] for x in (stack[:-1] if pop_tail else stack)]
     
     def get_status(self) -> str:
         """Get a human-readable status of what's currently being streamed."""
@@ -194,15 +492,19 @@ class LLMStreamReader:
 def call_llm(
     model: str,
     messages: List[Dict[str, Any]],
-    tool_schemas: List[Dict[str, Any]]
+    tool_schemas: List[Dict[str, Any]],
+    progress: bool = True,
+    message_encoder: Optional[MessageEncoder] = None
 ) -> Dict[str, Any]:
     """
-    Call the OpenRouter LLM API with retry logic and streaming.
+    Call the OpenRouter LLM API with retry logic and streaming. Safe to call from multiple threads.
 
     Args:
         model: Model identifier (e.g., "anthropic/claude-sonnet-4.5")
         messages: List of message dicts with role and content
         tool_schemas: List of tool schemas
+        progress: Show a live progress line (disable when calls run concurrently)
+        message_encoder: Encoder that remembers earlier messages of the same conversation
 
     Returns:
         Dict with:
@@ -216,11 +518,12 @@ def call_llm(
     # Check if we're in debug mode
     global _debug_llm_responses, _debug_llm_index
     if _debug_llm_responses is not None:
-        if _debug_llm_index >= len(_debug_llm_responses):
-            raise Exception(f"Debug LLM responses exhausted (needed {_debug_llm_index + 1}, have {len(_debug_llm_responses)})")
+        with _cost_lock:
+            if _debug_llm_index >= len(_debug_llm_responses):
+                raise Exception(f"Debug LLM responses exhausted (needed {_debug_llm_index + 1}, have {len(_debug_llm_responses)})")
 
-        response = _debug_llm_responses[_debug_llm_index]
-        _debug_llm_index += 1
+            response = _debug_llm_responses[_debug_llm_index]
+            _debug_llm_index += 1
 
         # Log the call
         log(tag='llm_call', model=model, cost=response.get('cost', 0),
@@ -230,58 +533,63 @@ def call_llm(
 
         return response
 
-    headers = {
-        'Content-Type': 'application/json',
-        'Authorization': f'Bearer {api_key}',
-        'HTTP-Referer': 'https://github.com/vanviegen/maca',
-        'X-Title': 'MACA - Multi-Agent Coding Assistant'
-    }
-
-    data = {
-        'model': model,
-        'messages': messages,
-        'tools': tool_schemas,
-        'usage': {"include": True},
-        'tool_choice': 'required',
-        'stream': True,
-        'streamOptions': {'includeUsage': True}
-        # 'reasoning': {
-        #     'effort': 'medium'
-        # }
-    }
+    # Serialize the request once. Everything but the messages is constant, so that part is cached.
+    prefix = _get_body_prefix(model, tool_schemas)
+    if message_encoder:
+        body = message_encoder.encode(messages, prefix, b'}')
+    else:
+        body = b''.join((prefix, json_dumps_bytes(messages), b'}'))
 
     # Retry up to 3 times
     last_error = None
     for retry in range(3):
-        start_time = time.time()
+        start_time = time.monotonic()
+        connection = None
 
         try:
-            cprint(C_INFO, "LLM: starting...", end="")
-
-            req = urllib.request.Request(
-                "https://openrouter.ai/api/v1/chat/completions",
-                data=json.dumps(data).encode('utf-8'),
-                headers=headers
-            )
-
-            # Stream the response
+            if progress:
+                cprint(C_INFO, "LLM: starting...", end="")
+
+            connection, response = _post(body, _HEADERS)
+            if response.status != 200:
+                retry_after = response.getheader('Retry-After')
+                # Read the full error body, so the connection can be reused
+                error_body = response.read()
+                if response.getheader('Content-Encoding') == 'gzip':
+                    error_body = zlib.decompress(error_body, wbits=31)
+                raise LLMHTTPError(f"HTTP {response.status} {response.reason}: {error_body.decode('utf-8', errors='replace')}",
+                                   response.status, float(retry_after) if retry_after and retry_after.isdigit() else None)
+
+            # Stream the response. read1 returns whatever has arrived (instead of waiting for a full
+            # buffer), and the incremental decoder holds on to multi-byte characters split across chunks.
+            # A gzip-compressed stream is inflated as it arrives.
             stream = LLMStreamReader()
+            decoder = codecs.getincrementaldecoder('utf-8')()
+            inflater = zlib.decompressobj(wbits=31) if response.getheader('Content-Encoding') == 'gzip' else None
 
-            with urllib.request.urlopen(req) as response:
+            with response:
                 while True:
-                    chunk = response.read(1024)
+                    chunk = response.read1(65536)
                     if not chunk:
                         break
 
-                    stream.process_chunk(chunk.decode('utf-8'))
+                    if inflater:
+                        chunk = inflater.decompress(chunk)
+                    stream.process_chunk(decoder.decode(chunk))
 
                     # Show progress with current field being written
-                    print('\r\033[K', end='')
-                    cprint(C_INFO, f'LLM: {stream.get_status()}... ({stream.get_bytes_received()} bytes)', end='')
+                    if progress:
+                        print('\r\033[K', end='')
+                        cprint(C_INFO, f'LLM: {stream.get_status()}... ({stream.get_bytes_received()} bytes)', end='')
+
+            # The response has been fully read, so the connection can serve the next request
+            _release_connection(connection)
+            connection = None
 
             # Clear progress line
-            print('\r\033[K', end='')
-            cprint(C_INFO, f'LLM: done! ({stream.get_bytes_received()} bytes)')
+            if progress:
+                print('\r\033[K', end='')
+                cprint(C_INFO, f'LLM: done! ({stream.get_bytes_received()} bytes)')
 
             # Validate we got a message
             if stream.message is None:
@@ -294,15 +602,17 @@ def call_llm(
 
             # Calculate cost
             cost = int(stream.usage.get('cost', 0) * 1_000_000) if stream.usage else 0  # Convert dollars to microdollars
-            duration = time.time() - start_time
+            duration = time.monotonic() - start_time
 
             # Update global cumulative cost
             global _cumulative_cost
-            _cumulative_cost += cost
+            with _cost_lock:
+                _cumulative_cost += cost
 
             # Log the call
             log(tag='llm_call', model=model, cost=cost, 
                 prompt_tokens=stream.usage.get('prompt_tokens', 0), 
+                cached_tokens=(stream.usage.get('prompt_tokens_details') or {}).get('cached_tokens', 0),
                 completion_tokens=stream.usage.get('completion_tokens', 0), 
                 duration=duration)
 
@@ -314,17 +624,25 @@ def call_llm(
 
         except Exception as e:
             last_error = e
-            if hasattr(e, 'read'):
-                error_body = e.read().decode('utf-8')
-            else:
-                error_body = str(e)
+            error_body = str(e)
+            if connection is not None:
+                if isinstance(e, LLMHTTPError):
+                    _release_connection(connection)
+                else:
+                    # The connection may be left in an undefined state (e.g. a partially read response)
+                    connection.close()
+            if isinstance(e, LLMHTTPError) and e.status not in RETRY_STATUSES:
+                # Client errors (bad request, authentication, ...) won't go away by retrying
+                break
 
             if retry < 2:  # Don't log on the last retry
                 cprint(C_BAD, f"LLM error: {error_body}. Attempt {retry+1}/3.")
                 log(tag='error', error="LLM ERROR", retry=retry, message=str(error_body))
+                # Back off exponentially, or as long as the server asks us to
+                time.sleep(getattr(e, 'retry_after', None) or RETRY_BACKOFF * 2 ** retry)
 
-    # All retries failed
-    raise Exception(f"LLM call failed after 3 retries: {last_error}")
+    # All retries failed (or the error wasn't retryable)
+    raise Exception(f"LLM call failed after {retry+1} attempt(s): {last_error}")
 
 
 def get_cumulative_cost() -> int:
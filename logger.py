@@ -1,7 +1,10 @@
 #!/usr/bin/env python3
-import json        
+import atexit
+import queue
 import random
 import string
+import threading
+import time
 from datetime import datetime
 from pathlib import Path
 
@@ -10,6 +13,19 @@ from pathlib import Path
 _log_file = None
 _verbose_mode = False
 
+# Formatted entries (bytes) and flush requests (threading.Event) waiting for the writer thread
+_write_queue = queue.SimpleQueue()
+_writer_thread = None
+_write_failed = False  # Whether a write error has been reported already
+
+# The writer thread collects entries for up to LOG_BATCH_DELAY seconds (or LOG_BATCH_SIZE entries)
+# before writing them out together. Flush requests are handled right away.
+LOG_BATCH_DELAY = 0.5
+LOG_BATCH_SIZE = 64
+
+# Maximum time (seconds) flush() waits for the writer thread, so a stuck write can't hang the exit
+LOG_FLUSH_TIMEOUT = 10
+
 
 def init(repo_root: Path, session_id: int):
     """
@@ -23,8 +39,57 @@ def init(repo_root: Path, session_id: int):
     maca_dir = Path(repo_root) / '.maca'
     maca_dir.mkdir(parents=True, exist_ok=True)
 
-    global _log_file
-    _log_file = open(maca_dir / f"{session_id}.log", 'a')
+    global _log_file, _writer_thread
+    if _log_file is not None:
+        flush()
+        _log_file.close()
+    _log_file = open(maca_dir / f"{session_id}.log", 'ab')
+
+    if _writer_thread is None:
+        _writer_thread = threading.Thread(target=_writer_loop, name='maca-logger', daemon=True)
+        _writer_thread.start()
+        atexit.register(flush)
+
+
+def _writer_loop():
+    """Write queued log entries to disk in batches, coalescing each batch into a single write."""
+    while True:
+        items = [_write_queue.get()]
+        deadline = time.monotonic() + LOG_BATCH_DELAY
+        while len(items) < LOG_BATCH_SIZE and not isinstance(items[-1], threading.Event):
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                items.append(_write_queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+
+        data = b''.join(item for item in items if isinstance(item, bytes))
+        if data:
+            # A failed write (e.g. a full disk) loses this batch, but mustn't stop the thread, as
+            # flush requests would never be answered then
+            try:
+                _log_file.write(data)
+                _log_file.flush()
+            except Exception as e:
+                global _write_failed
+                if not _write_failed:
+                    _write_failed = True
+                    cprint(C_BAD, f'Error writing to the log file: {e}')
+
+        for item in items:
+            if isinstance(item, threading.Event):
+                item.set()
+
+
+def flush():
+    """Block until all entries logged so far have been written to disk (or LOG_FLUSH_TIMEOUT has passed)."""
+    if _writer_thread is None or not _writer_thread.is_alive():
+        return
+    done = threading.Event()
+    _write_queue.put(done)
+    done.wait(timeout=LOG_FLUSH_TIMEOUT)
 
 def _find_heredoc_delimiter(value: str) -> str:
     """Find a delimiter that doesn't appear in the value."""
@@ -47,10 +112,18 @@ def set_verbose(enabled: bool):
     _verbose_mode = enabled
 
 
+def is_verbose() -> bool:
+    """Return whether verbose mode is enabled."""
+    return _verbose_mode
+
+
 def log(**kwargs):
     """
     Log an entry to the log file.
 
+    The entry is formatted right away (values may be mutated by the caller afterwards), but
+    writing it to disk is left to a background thread, so logging doesn't block on I/O.
+
     Args:
         **kwargs: Arbitrary key-value pairs to log
     """
@@ -65,12 +138,15 @@ def log(**kwargs):
     lines = []
     lines.append(f'timestamp: {timestamp}')
 
+    # When verbose, the entry is printed in one go (each print call flushes the terminal)
+    verbose_parts = []
+
     # Add all kwargs as key-value pairs
     for key, value in kwargs.items():
         # Handle non-string types by encoding as JSON
         if not isinstance(value, str):
             key += '!'
-            value = json.dumps(value)
+            value = json_dumps_bytes(value).decode('utf-8')
         else:
             value = value.strip()
             if '\n' in value or value.startswith('<<<'):
@@ -78,14 +154,14 @@ def log(**kwargs):
                 value = f'<<<{delimiter}\n{value}\n{delimiter}'
         lines.append(f'{key}: {value}')
         if _verbose_mode:
-            cprint(key, C_LOG, ": "+value)
+            verbose_parts += (C_NORMAL, key, C_LOG, ": " + value + "\n")
 
     log_text = '\n'.join(lines) + '\n\n'
-    _log_file.write(log_text)
-    _log_file.flush()  # Ensure it's written immediately
+    _write_queue.put(log_text.encode('utf-8'))
 
     if _verbose_mode:
-        print()
+        # The final newline leaves a blank line after the entry
+        cprint(*verbose_parts)
 
 
 def read_log(repo_root: Path, session_id: int, context_id: str) -> list:
@@ -97,7 +173,7 @@ def read_log(repo_root: Path, session_id: int, context_id: str) -> list:
         current_entry = {}
         delimiter = key = value = is_json = None
 
-        with open(log_path, 'r') as f:
+        with open(log_path, 'r', encoding='utf-8') as f:
             for line in f:
                 if delimiter:
                     # Inside HEREDOC
@@ -106,7 +182,7 @@ def read_log(repo_root: Path, session_id: int, context_id: str) -> list:
                         continue
 
                     # End of HEREDOC
-                    current_entry[key] = json.loads(value) if is_json else value
+                    current_entry[key] = json_loads(value) if is_json else value
                     delimiter = None
                 else:
                     line = line.rstrip()
@@ -135,7 +211,7 @@ def read_log(repo_root: Path, session_id: int, context_id: str) -> list:
                 # Check if key has ! suffix (JSON-encoded value)
                 if key.endswith('!'):
                     key = key[:-1]
-                    value = json.loads(value)
+                    value = json_loads(value)
                 
                 current_entry[key] = value
             
@@ -146,4 +222,4 @@ def read_log(repo_root: Path, session_id: int, context_id: str) -> list:
         return True
 
 
-from utils import cprint, C_LOG
+from utils import cprint, json_dumps_bytes, json_loads, C_BAD, C_LOG, C_NORMAL
@@ -1,12 +1,10 @@
 #!/usr/bin/env python3
 """Multi-Agent Coding Assistant - Main entry point."""
 
-from copy import copy, deepcopy
+from copy import copy
 import sys
-import json
 from pathlib import Path
 from typing import Dict, Any, Optional
-from unittest import result
 
 from prompt_toolkit import prompt as pt_prompt
 from prompt_toolkit.shortcuts import choice
@@ -14,8 +12,8 @@ from prompt_toolkit.history import FileHistory
 
 import git_ops
 import tools
-from utils import cprint, compute_diff, C_GOOD, C_BAD, C_NORMAL, C_IMPORTANT, C_INFO, C_LOG
-from llm import call_llm, get_cumulative_cost
+from utils import cprint, compute_diff, json_dumps, json_loads, read_prompt, read_text_cached, C_GOOD, C_BAD, C_NORMAL, C_IMPORTANT, C_INFO, C_LOG
+from llm import call_llm, get_cumulative_cost, prewarm_connection, with_cache_control, CACHE_CONTROL_MODELS, MessageEncoder
 from logger import log
 import logger
 import code_map
@@ -24,6 +22,9 @@ PERSIST_TEMPORARY = 1
 PERSIST_LONG_TERM = 2 
 PERSIST_PERMANENT = 4
 
+# Serialized size (in bytes, roughly 4 per token) above which the oldest conversation turns are dropped
+MAX_HISTORY_SIZE = 400_000
+
 class ContextError(Exception):
     """Context operation failed."""
     pass
@@ -63,6 +64,10 @@ class MACA:
         self.messages: list[Dict] = []
         self.long_term_messages: list[Dict] = []
         self.permanent_messages: list[Dict] = []
+        self.permanent_size = 0  # Serialized size of permanent_messages
+        self.first_temporary_index = None  # Index in messages of the first temporary message, if any
+        self.cache_marked_message = None  # (message, copy marked with cache_control) as last sent
+        self.message_encoder = MessageEncoder()
         self.last_head_commit = None
 
         # State tracking for AGENTS.md and code_map
@@ -100,26 +105,28 @@ class MACA:
 
     def _load_system_prompt(self):
         """Load the system prompt from prompt.md."""
-        # Find prompt.md (next to the script)
-        script_dir = Path(__file__).parent
-        prompt_path = script_dir / 'prompt.md'
-
-        if not prompt_path.exists():
-            raise ContextError(f"System prompt not found: {prompt_path}")
-
-        system_prompt = prompt_path.read_text()
+        try:
+            system_prompt = read_prompt('prompt.md')
+        except FileNotFoundError as e:
+            raise ContextError(f"System prompt not found: {e.filename}")
 
-        self.add_message({
-            'role': 'system',
-            'content': system_prompt
-        })
+        # The system prompt never changes during a session, so mark it as a prompt cache breakpoint
+        # (for models that need explicit breakpoints; others get a plain string, like the history)
+        message = {'role': 'system', 'content': system_prompt}
+        if self.model.startswith(CACHE_CONTROL_MODELS):
+            message = with_cache_control(message)
+        self.add_message(message)
 
 
     def update_state(self):
         """Update state tracking for AGENTS.md and code_map."""
-        agents_md_path = self.repo_root / 'AGENTS.md'
+        # Only reread when changed. An unchanged file gives the same string, so comparing is cheap too.
+        try:
+            agents_md = read_text_cached(self.repo_root / 'AGENTS.md')
+        except FileNotFoundError:
+            agents_md = "--None yet--"
         state = {
-            "AGENTS.md": agents_md_path.read_text() if agents_md_path.exists() else "--None yet--",
+            "AGENTS.md": agents_md,
             "Code Map": code_map.generate_code_map(str(self.worktree_path))
         }
 
@@ -138,13 +145,19 @@ class MACA:
 
         if not self.prev_state:
             org_size = 0
-            for name, new in state.items():
+            for index, (name, new) in enumerate(state.items()):
                 org_size += len(new)
-                self.add_message({
+                message = {
                     'role': 'user',
                     'content': f"[[{name}]]\n\n{new}"
-                }, 'state')
-            
+                }
+                # The full state stays unchanged until the next rewrite (updates are appended as diffs),
+                # so it ends a stable prefix. This breakpoint keeps that prefix cached even when a long
+                # turn moves the history breakpoint beyond the provider's lookback window.
+                if index == len(state) - 1 and self.model.startswith(CACHE_CONTROL_MODELS):
+                    message = with_cache_control(message)
+                self.add_message(message, 'state')
+
             self.state_delta_threshold = int(0.25 * org_size)
 
         self.prev_state = state
@@ -154,23 +167,69 @@ class MACA:
         """Add a message dict to the context and the log. Persistence can be normal, temporary, long-term-only, state."""
         log(tag='message', persistence=persistence, **message)
         if persistence != 'long-term-only':
+            if persistence == 'temporary' and self.first_temporary_index is None:
+                self.first_temporary_index = len(self.messages)
             self.messages.append(message)
         if persistence != 'temporary':
             self.long_term_messages.append(message)
+            # Measured by the encoder, so the encoding is reused when the message is sent
             if persistence == 'state':
-                self.state_delta_threshold -= len(json.dumps(message))
+                self.state_delta_threshold -= self.message_encoder.encoded_size(message)
             else:
                 self.permanent_messages.append(message)
+                self.permanent_size += self.message_encoder.encoded_size(message)
 
 
     def clear_temporary_messages(self):
         """Clear all temporary messages from the context."""
-        if self.state_delta_threshold <= 0:
+        rewrite = self.state_delta_threshold <= 0
+        if rewrite:
             cprint(C_IMPORTANT, '→ State changes exceed 25% of original size, rewriting history')
-            self.long_term_messages = self.permanent_messages.copy()
+        if self.permanent_size > MAX_HISTORY_SIZE and self.trim_history():
+            rewrite = True
+        if rewrite:
+            self.long_term_messages[:] = self.permanent_messages
             self.prev_state = None
             self.update_state()
-        self.messages = self.long_term_messages.copy()  # Make a copy to avoid aliasing
+        # Refill in place (copying, so the lists don't alias) rather than allocating a new list each turn
+        self.messages[:] = self.long_term_messages
+        self.first_temporary_index = None
+
+
+    def trim_history(self):
+        """
+        Drop the oldest conversation turns until the history fits within MAX_HISTORY_SIZE.
+
+        The system prompt stays pinned, and so does the most recent plain user message (the
+        current task). Only whole turns before that task are dropped, each starting at a plain
+        user message, so no tool result is left without the assistant message it responds to.
+
+        Returns:
+            Whether any messages were dropped
+        """
+        messages = self.permanent_messages
+
+        def starts_turn(message):
+            return message['role'] == 'user' and not isinstance(message['content'], list)
+
+        task = next((index for index in range(len(messages) - 1, 0, -1) if starts_turn(messages[index])), 1)
+        size = self.permanent_size
+        end = 1
+        while end < task and size > MAX_HISTORY_SIZE:
+            size -= self.message_encoder.encoded_size(messages[end])
+            end += 1
+            while end < task and not starts_turn(messages[end]):
+                size -= self.message_encoder.encoded_size(messages[end])
+                end += 1
+
+        if end == 1:
+            return False
+
+        cprint(C_IMPORTANT, f'→ History exceeds {MAX_HISTORY_SIZE} bytes, dropping the {end - 1} oldest messages')
+        log(tag='history_trimmed', dropped_messages=end - 1)
+        self.permanent_size = size
+        del messages[1:end]
+        return True
 
 
     def run_main_loop(self):
@@ -181,43 +240,49 @@ class MACA:
             None (runs until complete() is called)
         """
         done = False
-        last_cache_control_content = None
 
         # Loop until completion
         while not done:
 
-            # The message previous to the first transient message gets the cache control header
-            if last_cache_control_content:
-                del last_cache_control_content['cache_control']
-            for index, msg in enumerate(self.messages):
-                if msg not in self.long_term_messages:
-                    if index > 0:
-                        last_cache_control_content = self.messages[index-1]['content']
-                        if not isinstance(last_cache_control_content, dict):
-                            last_cache_control_content = self.messages[index-1]['content'] = {"type": "text", "text": last_cache_control_content}
-                        last_cache_control_content['cache_control'] = {'type': 'ephemeral'}
-                    break
+            # The message previous to the first transient message gets the cache control header, as
+            # everything up to there is resent unchanged next turn. Stored messages are never mutated
+            # (their encoding is cached), so a marked copy is sent in its place. That copy is kept for
+            # as long as the breakpoint stays put, so its encoding is reused as well.
+            messages = self.messages
+            index = self.first_temporary_index
+            if index and self.model.startswith(CACHE_CONTROL_MODELS):
+                messages = self.messages.copy()
+                if not self.cache_marked_message or self.cache_marked_message[0] is not messages[index-1]:
+                    self.cache_marked_message = (messages[index-1], with_cache_control(messages[index-1]))
+                messages[index-1] = self.cache_marked_message[1]
 
             # Call LLM (retry logic is in call_llm)
             result = call_llm(
                 model=self.model,
-                messages=self.messages,
-                tool_schemas=[tools.RESPOND_TOOL_SCHEMA],
+                messages=messages,
+                tool_schemas=tools.RESPOND_TOOL_SCHEMAS,
+                message_encoder=self.message_encoder,
             )
 
             # Log the full message temporarily. The respond function will strip 'message' of details,
             # so we can log the short version to long-term below.
             message = result['message']
-            self.add_message(deepcopy(message), 'temporary')
+            # A shallow copy suffices, as only top-level keys of a message are ever replaced
+            self.add_message(copy(message), 'temporary')
 
             # Process tool call from LLM response
-            tool_calls = message.get('tool_calls', [])
-            if len(tool_calls) != 1:
-                raise ContextError(f"Expected exactly 1 tool call, got {len(tool_calls)}")
-            tool_call = tool_calls[0]
+            try:
+                (tool_call,) = message['tool_calls']
+            except (KeyError, TypeError, ValueError):
+                raise ContextError(f"Expected exactly 1 tool call, got {len(message.get('tool_calls') or [])}")
             
-            args = json.loads(tool_call['function']['arguments'])
-            log(tag='tool_call', **args)
+            args = json_loads(tool_call['function']['arguments'])
+            # The arguments were already logged with the assistant message above. Logging them again
+            # unpacked (with readable multi-line strings) is only worth the write when following along.
+            if logger.is_verbose():
+                log(tag='tool_call', **args)
+            # Have a connection ready for the next call by the time the tool work is done
+            prewarm_connection()
             (temporary_response, done) = tools.respond(**args, maca=self)
 
             # Add assistant message (and trimmed version) to history
@@ -240,7 +305,7 @@ class MACA:
                 'content': [{
                     'type': 'tool_result',
                     'tool_use_id': tool_call['id'],
-                    'content': json.dumps(temporary_response),
+                    'content': json_dumps(temporary_response),
                 }]
             }, 'temporary')
 
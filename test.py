@@ -243,6 +243,558 @@ def run_test_case(test_case: TestCase):
 
 
 
+def run_history_trim_test():
+    """Check that trimming a long history keeps the system prompt and the current task."""
+    print("\n=== Test: History Trimming ===")
+
+    maca_module = sys.modules[MACA.__module__]
+    maca = MACA(directory='.', task=None, model='test-model')
+
+    def add_turns(count):
+        for i in range(count):
+            maca.add_message({'role': 'assistant', 'content': '', 'tool_calls': [{'id': f'call_{i}', 'type': 'function', 'function': {'name': 'respond', 'arguments': 'x' * 20_000}}]})
+            maca.add_message({'role': 'user', 'content': [{'type': 'tool_result', 'tool_use_id': f'call_{i}', 'content': 'OMITTED'}]}, 'long-term-only')
+
+    maca.add_message({'role': 'system', 'content': 'System prompt'})
+    maca.add_message({'role': 'user', 'content': 'Earlier task'})
+    add_turns(10)
+    maca.add_message({'role': 'user', 'content': 'Current task'})
+    add_turns(30)
+
+    org_limit = maca_module.MAX_HISTORY_SIZE
+    maca_module.MAX_HISTORY_SIZE = 100_000
+    try:
+        assert maca.trim_history(), "The earlier task should have been dropped"
+        messages = maca.permanent_messages
+        assert messages[0]['content'] == 'System prompt', "The system prompt should be kept"
+        assert messages[1]['content'] == 'Current task', f"The current task should follow the system prompt, got {messages[1]}"
+        assert len(messages) == 2 + 2 * 30, "The turns of the current task should be kept"
+        assert maca.permanent_size == sum(maca.message_encoder.encoded_size(message) for message in messages)
+
+        # Nothing before the current task is left to drop, so it is never dropped itself
+        assert not maca.trim_history(), "Nothing should be dropped"
+        assert messages[1]['content'] == 'Current task'
+    finally:
+        maca_module.MAX_HISTORY_SIZE = org_limit
+
+    print("✓ Test passed: History Trimming")
+
+
+def processor_response(tool_name: str, result: str) -> Dict:
+    """Build a call_llm result in which a processor responds with the given tool."""
+    arguments = json.dumps({'thoughts': '', 'result': result})
+    return {'message': {'role': 'assistant', 'content': None, 'tool_calls': [
+        {'id': 'call_1', 'type': 'function', 'function': {'name': tool_name, 'arguments': arguments}}
+    ]}, 'cost': 0, 'usage': {}}
+
+
+def run_shell_before_processors_test():
+    """Check that sub-processors read files only after the shell commands writing them are done."""
+    print("\n=== Test: Shell Commands Before Sub-Processors ===")
+
+    import time
+    import tools
+
+    repo_path = setup_test_repo()
+    org_run_in_container, org_call_llm = tools.run_in_container, tools.call_llm
+    prompts = []
+
+    def slow_writing_command(command, worktree_path, **kwargs):
+        # Write the file in parts, like a build tool generating output
+        with open(worktree_path / 'generated.txt', 'w') as file:
+            file.write('partial\n')
+            file.flush()
+            time.sleep(0.3)
+            file.write('complete\n')
+        return {'stdout': '', 'stderr': '', 'exit_code': 0}
+
+    def recording_call_llm(messages, tool_schemas, **kwargs):
+        prompts.append(messages[-1]['content'])
+        return processor_response(tool_schemas[0]['function']['name'], 'ok')
+
+    class FakeMaca:
+        worktree_path = repo_path
+        repo_root = repo_path
+        last_head_commit = None
+        non_interactive = True
+
+    tools.run_in_container, tools.call_llm = slow_writing_command, recording_call_llm
+    set_cprint_callback(lambda text, end: None)
+    try:
+        tools.respond(
+            thoughts='',
+            shell_commands=[{'command': 'generate'}],
+            sub_processors=[{'model': 'tiny', 'assignment': 'Summarize', 'file_reads': [{'path': 'generated.txt'}]}],
+            keep_extended_context=True,
+            maca=FakeMaca(),
+        )
+        assert len(prompts) == 1, f"Expected one processor call, got {len(prompts)}"
+        assert 'partial\\ncomplete\\n' in prompts[0], f"Processor should see the complete file, got {prompts[0]!r}"
+    finally:
+        tools.run_in_container, tools.call_llm = org_run_in_container, org_call_llm
+        set_cprint_callback(None)
+        teardown_test_repo(repo_path)
+
+    print("✓ Test passed: Shell Commands Before Sub-Processors")
+
+
+def start_tls_server(cert_dir: Path, idle_timeout: float):
+    """
+    Start a local HTTPS server (TLS 1.3, self-signed) that answers POSTs with an empty JSON object.
+
+    Idle connections are closed after idle_timeout seconds, like OpenRouter's keep-alive timeout.
+    Returns the server and a client SSL context that trusts its certificate.
+    """
+    import http.server
+    import socketserver
+    import ssl
+    import threading
+
+    cert, key = cert_dir / 'cert.pem', cert_dir / 'key.pem'
+    subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1', '-subj', '/CN=localhost',
+                    '-keyout', str(key), '-out', str(cert)], check=True, capture_output=True)
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        timeout = idle_timeout
+
+        def setup(self):
+            super().setup()
+            server.connection_count += 1
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers['Content-Length']))
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', '2')
+            self.end_headers()
+            self.wfile.write(b'{}')
+
+        def log_message(self, *args):
+            pass
+
+    class Server(socketserver.ThreadingMixIn, http.server.HTTPServer):
+        daemon_threads = True
+
+    server_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    server_context.minimum_version = ssl.TLSVersion.TLSv1_3
+    server_context.load_cert_chain(cert, key)
+    server = Server(('localhost', 0), Handler)
+    server.connection_count = 0
+    server.socket = server_context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    client_context = ssl.create_default_context(cafile=str(cert))
+    return server, client_context
+
+
+def run_dropped_connection_test():
+    """Check that idle pooled connections are only considered dropped once the server has closed them."""
+    print("\n=== Test: Dropped Connection Detection ===")
+
+    import http.client
+    import time
+    import llm
+
+    cert_dir = Path(tempfile.mkdtemp(prefix='maca_tls_'))
+    server, context = start_tls_server(cert_dir, idle_timeout=1)
+    try:
+        connection = http.client.HTTPSConnection('localhost', server.server_address[1], context=context)
+        connection.connect()
+        time.sleep(0.3)  # The server's session tickets have arrived by now, making the socket readable
+        assert not llm._is_dropped(connection), "A connection that only received session tickets should be alive"
+        assert not llm._is_dropped(connection), "Checking should not change the outcome"
+
+        time.sleep(1.2)  # Beyond the server's idle timeout
+        assert llm._is_dropped(connection), "A connection closed by the server should be dropped"
+        connection.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(cert_dir)
+
+    print("✓ Test passed: Dropped Connection Detection")
+
+
+def run_prewarm_test():
+    """Check that a prewarmed connection stays pooled and is used by the next LLM request."""
+    print("\n=== Test: Connection Prewarming ===")
+
+    import http.client
+    import threading
+    import time
+    import llm
+
+    cert_dir = Path(tempfile.mkdtemp(prefix='maca_tls_'))
+    server, context = start_tls_server(cert_dir, idle_timeout=10)
+    org_open_connection = llm._open_connection
+
+    def open_local_connection():
+        connection = http.client.HTTPSConnection('localhost', server.server_address[1], context=context)
+        connection.connect()
+        return connection
+
+    llm._open_connection = open_local_connection
+    try:
+        llm.prewarm_connection()
+        for thread in threading.enumerate():
+            if thread.name.endswith('(_prewarm)'):
+                thread.join()
+        assert len(llm._idle_connections) == 1, "A connection should have been prewarmed"
+        prewarmed = llm._idle_connections[0]
+
+        time.sleep(0.3)  # Let the session tickets arrive
+        llm.prewarm_connection()
+        assert llm._idle_connections == [prewarmed], "The prewarmed connection should be kept"
+
+        connection, response = llm._post(b'{}', {'Content-Type': 'application/json'})
+        assert connection is prewarmed, "The request should use the prewarmed connection"
+        assert response.read() == b'{}'
+        llm._release_connection(connection)
+        assert server.connection_count == 1, f"Expected a single connection, got {server.connection_count}"
+    finally:
+        llm._open_connection = org_open_connection
+        llm._close_idle_connections()
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(cert_dir)
+
+    print("✓ Test passed: Connection Prewarming")
+
+
+# A stand-in for docker/podman, keeping its state in files next to it: `dead` lists containers that
+# were stopped, `labels` has the stale container lookup output, and every call is logged to `calls`
+FAKE_CONTAINER_RUNTIME = r'''#!/bin/sh
+dir=$(dirname "$0")
+echo "$*" >> "$dir/calls"
+case "$1" in
+    run)
+        count=$(( $(cat "$dir/count" 2>/dev/null || echo 0) + 1 ))
+        echo $count > "$dir/count"
+        echo "container$count";;
+    ps)
+        cut -d' ' -f1 "$dir/labels";;
+    container)
+        case "$4" in
+            *State.Running*) ! grep -qx "$5" "$dir/dead" && echo true;;
+            *) cat "$dir/labels";;
+        esac;;
+    exec)
+        if grep -qx "$4" "$dir/dead"; then
+            echo "Error: no such container $4" >&2
+            exit 125
+        fi
+        shift 4
+        exec "$@";;
+esac
+'''
+
+
+def run_container_recovery_test():
+    """Check that stale containers are removed, and that a container that is gone is replaced."""
+    print("\n=== Test: Container Recovery ===")
+
+    import os
+    import docker_ops
+
+    runtime_dir = Path(tempfile.mkdtemp(prefix='maca_runtime_'))
+    runtime = runtime_dir / 'runtime'
+    runtime.write_text(FAKE_CONTAINER_RUNTIME)
+    runtime.chmod(0o755)
+    (runtime_dir / 'dead').write_text('')
+    exited = subprocess.Popen(['true'])
+    exited.wait()
+    (runtime_dir / 'labels').write_text(f'stale {exited.pid}\nalive {os.getpid()}\n')
+
+    def calls(command):
+        return [line for line in (runtime_dir / 'calls').read_text().splitlines() if line.startswith(command + ' ')]
+
+    org_runtime, org_removed = docker_ops._CONTAINER_RUNTIME, docker_ops._stale_containers_removed
+    docker_ops._CONTAINER_RUNTIME, docker_ops._stale_containers_removed = str(runtime), False
+    try:
+        result = docker_ops.run_in_container('echo first', runtime_dir, runtime_dir)
+        assert result['stdout'] == 'first\n' and result['exit_code'] == 0, f"Unexpected result {result}"
+        assert calls('rm') == ['rm --force stale'], f"Only the stale container should be removed, got {calls('rm')}"
+        assert f'--label maca.pid={os.getpid()}' in calls('run')[0], "Containers should be labelled"
+
+        # The container was stopped outside of maca, so the command is run in a new one
+        (runtime_dir / 'dead').write_text('container1\n')
+        result = docker_ops.run_in_container('echo second', runtime_dir, runtime_dir)
+        assert result['stdout'] == 'second\n' and result['exit_code'] == 0, f"Unexpected result {result}"
+        assert len(calls('run')) == 2, "A single new container should have been started"
+        assert list(docker_ops._CONTAINERS.values()) == ['container2']
+
+        # A command failing with a similar message is not retried
+        result = docker_ops.run_in_container('echo "db is not running" >&2; exit 3', runtime_dir, runtime_dir)
+        assert result['exit_code'] == 3, f"Unexpected result {result}"
+        assert len(calls('exec')) == 4, "The failed command should not have been retried"
+    finally:
+        docker_ops._CONTAINERS.clear()
+        docker_ops._CONTAINER_RUNTIME, docker_ops._stale_containers_removed = org_runtime, org_removed
+        shutil.rmtree(runtime_dir)
+
+    print("✓ Test passed: Container Recovery")
+
+
+def run_stream_reader_test():
+    """Check that the incremental scan of streamed tool call arguments matches a scan from scratch."""
+    print("\n=== Test: Stream Reader Argument Scanning ===")
+
+    from llm import LLMStreamReader
+
+    arguments = json.dumps({
+        'thoughts': 'Say "hi" \\ there',
+        'file_changes': [
+            {'path': 'a.txt', 'data': 'x'},
+            {'path': 'b"c', 'search': [1, -2.5e3, True, None], 'nested': {'deep': [[{'k': 'value'}]], 'empty': {}}},
+        ],
+        'done': False,
+        'count': 12,
+    })
+    path = LLMStreamReader()._find_truncation_point(arguments[:arguments.index('valu')])
+    assert path[0] == 'file_changes' and path[2:] == ['nested', 'deep', 0, 0, 'k'], f"Unexpected path {path}"
+
+    for delta_size in (1, 2, 3, 5, 8):
+        deltas = [arguments[i:i + delta_size] for i in range(0, len(arguments), delta_size)]
+        events = ''.join(
+            'data: ' + json.dumps({'choices': [{'delta': {'tool_calls': [{'index': 0, 'function': {'arguments': delta}}]}}]}) + '\n\n'
+            for delta in deltas
+        )
+        for chunk_size in (7, 64):
+            reader = LLMStreamReader()
+            for i in range(0, len(events), chunk_size):
+                reader.process_chunk(events[i:i + chunk_size])
+                partial = reader._partial_arg_json
+                path = reader._find_truncation_point(partial)
+                fresh_path = LLMStreamReader()._find_truncation_point(partial)
+                assert path == fresh_path, f"After {partial!r}: incremental path {path}, full scan {fresh_path}"
+            assert reader.message['tool_calls'][0]['function']['arguments'] == arguments
+
+    print("✓ Test passed: Stream Reader Argument Scanning")
+
+
+def run_output_lines_test():
+    """Check the head/tail truncation of command output, including combining stdout and stderr."""
+    print("\n=== Test: Output Truncation ===")
+
+    from docker_ops import OutputLines
+
+    def stripped(count):
+        return f"\n\n... {count} more lines stripped (change head/tail to see them, or use grep to search for specific output) ...\n\n"
+
+    # head, tail, stdout, stderr, expected combined output, expected stderr
+    cases = [
+        (2, 2, 'a\nb\n', '', 'a\nb\n', ''),
+        (1, 1, 'a\nb\nc\n', '', 'a' + stripped(2), ''),
+        (2, 1, 'a\nb\nc\nd', '', 'a\nb' + stripped(1) + 'd', ''),
+        # The partial last line of stdout is continued by stderr
+        (2, 2, 'out', 'err\nmore\n', 'outerr\nmore\n', 'err\nmore\n'),
+        (1, 1, 'a\nb', 'c\nd\ne', 'a' + stripped(2) + 'e', 'c' + stripped(1) + 'e'),
+        # Lines skipped in stderr are counted in the combined output
+        (1, 1, 'a\n', '1\n2\n3\n4', 'a' + stripped(3) + '4', '1' + stripped(2) + '4'),
+        (2, 0, 'a\nb\nc\n', 'x\ny', 'a\nb' + stripped(3), 'x\ny'),
+        (0, 2, 'a\nb', '1\n2\n3\n4\n', stripped(4) + '4\n', stripped(3) + '4\n'),
+        (0, 0, 'a', 'b', stripped(1), stripped(1)),
+    ]
+    for head, tail, stdout_text, stderr_text, expected, expected_stderr in cases:
+        for chunk_size in (1, 3, 1000):
+            stdout, stderr = OutputLines(head, tail), OutputLines(head, tail)
+            for output, text in ((stdout, stdout_text), (stderr, stderr_text)):
+                data = text.encode()
+                for i in range(0, len(data), chunk_size):
+                    output.feed(data[i:i + chunk_size])
+            stdout.extend(stderr)
+            case = f"head={head} tail={tail} stdout={stdout_text!r} stderr={stderr_text!r} chunk_size={chunk_size}"
+            assert stdout.text() == expected, f"{case}: combined output {stdout.text()!r}, expected {expected!r}"
+            assert stderr.text() == expected_stderr, f"{case}: stderr {stderr.text()!r}, expected {expected_stderr!r}"
+
+    print("✓ Test passed: Output Truncation")
+
+
+def apply_diff(old_text: str, diff: str) -> str:
+    """Apply a diff as produced by compute_diff, checking its context and hunk header line numbers."""
+    import re
+
+    assert diff.startswith('--- +++ '), f"Unexpected diff header in {diff!r}"
+    old_lines = old_text.splitlines(keepends=True)
+    new_lines = []
+    pos = 0
+    parts = re.split(r'@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@', diff[len('--- +++ '):])
+    for i in range(1, len(parts), 5):
+        old_start, old_count, new_start, new_count, body = parts[i:i + 5]
+        # An empty range starts after the given line
+        start = int(old_start) - (old_count != '0')
+        new_lines += old_lines[pos:start]
+        pos = start
+        assert len(new_lines) == int(new_start) - (new_count != '0'), f"Wrong new start in hunk {i // 5}"
+        for line in body.splitlines(keepends=True):
+            if line[0] in ' -':
+                assert old_lines[pos] == line[1:], f"Line {pos + 1} should be {line[1:]!r}, got {old_lines[pos]!r}"
+                pos += 1
+            if line[0] in ' +':
+                new_lines.append(line[1:])
+    return ''.join(new_lines + old_lines[pos:])
+
+
+def run_compute_diff_test():
+    """Check the hunk headers of compute_diff, and that its diffs apply, with and without libgit2."""
+    print("\n=== Test: Diff Computation ===")
+
+    import difflib
+    import utils
+
+    lines = [f'line {i}\n' for i in range(40)]
+
+    def changed(*edits):
+        new_lines = list(lines)
+        for index, replacement in sorted(edits, reverse=True):
+            new_lines[index:index + 1] = replacement
+        return ''.join(new_lines)
+
+    old_text = ''.join(lines)
+    cases = {
+        'start': (old_text, changed((0, ['first\n']))),
+        'middle': (old_text, changed((20, ['changed\n']), (25, ['line 25\n', 'inserted\n']))),
+        'end': (old_text, changed((39, []))),
+        'start and end': (old_text, changed((1, []), (38, ['new 38\n', 'new 38b\n']))),
+        'missing trailing newline': (old_text, old_text[:-1]),
+        'added trailing newline': (old_text[:-1], old_text),
+        'appended to missing trailing newline': (old_text[:-1], old_text + 'appended\n'),
+        'everything': ('a\nb\n', 'c\n'),
+    }
+
+    org_pygit2 = utils.pygit2
+    try:
+        for utils.pygit2 in {org_pygit2, None}:
+            for name, (old, new) in cases.items():
+                name = f"{name} ({'libgit2' if utils.pygit2 else 'difflib'})"
+                diff = utils.compute_diff(old, new)
+                # The same diff as from difflib on the whole texts
+                expected = ''.join(difflib.unified_diff(old.splitlines(keepends=True), new.splitlines(keepends=True), lineterm=''))
+                assert diff == expected, f"{name}: got diff {diff!r}, expected {expected!r}"
+                # A removed last line without a line end runs into the next diff line, so can't be applied
+                if old.endswith('\n'):
+                    assert apply_diff(old, diff) == new, f"{name}: diff doesn't apply: {diff!r}"
+            assert utils.compute_diff(old_text, old_text) is None
+    finally:
+        utils.pygit2 = org_pygit2
+
+    print("✓ Test passed: Diff Computation")
+
+
+def run_git_refs_test():
+    """Check that HEAD is read correctly from the ref files, and that git itself is used for reftables."""
+    print("\n=== Test: Reading Git Refs ===")
+
+    repo_path = setup_test_repo()
+    worktree_path = repo_path.parent / (repo_path.name + '_worktree')
+    git_calls = []
+    org_run_git, org_pygit2 = git_ops.run_git, git_ops.pygit2
+
+    def git(*args, cwd=repo_path):
+        return subprocess.run(['git', *args], cwd=cwd, check=True, capture_output=True, text=True).stdout.strip()
+
+    def recording_run_git(*args, **kwargs):
+        git_calls.append(args)
+        return org_run_git(*args, **kwargs)
+
+    def check(path, hand_parsed=True):
+        git_ops._git_dirs.clear()
+        git_ops._head_cache.clear()
+        git_calls.clear()
+        assert git_ops.get_head_commit(path) == git('rev-parse', 'HEAD', cwd=path), f"Wrong HEAD commit for {path}"
+        assert git_ops.get_current_branch(path) == git('rev-parse', '--abbrev-ref', 'HEAD', cwd=path), f"Wrong branch for {path}"
+        if hand_parsed:
+            assert not git_calls, f"HEAD should be read from files, but git was run with {git_calls}"
+        else:
+            assert ('rev-parse', 'HEAD') in git_calls, "git should have been used"
+
+    git_ops.run_git, git_ops.pygit2 = recording_run_git, None
+    try:
+        git('worktree', 'add', '-b', 'feature', str(worktree_path))
+        (worktree_path / 'feature.txt').write_text('feature\n')
+        git('add', 'feature.txt', cwd=worktree_path)
+        git('commit', '-m', 'Feature', cwd=worktree_path)
+        check(repo_path)
+        check(worktree_path)
+
+        # Only in packed-refs
+        git('pack-refs', '--all')
+        assert not (repo_path / '.git' / 'refs' / 'heads' / 'feature').exists()
+        check(repo_path)
+        check(worktree_path)
+
+        # A detached HEAD holds the commit itself, but has no branch name to read
+        git('checkout', '--detach', cwd=worktree_path)
+        git_ops._head_cache.clear()
+        assert git_ops.get_head_commit(worktree_path) == git('rev-parse', 'HEAD', cwd=worktree_path)
+        assert git_ops.get_current_branch(worktree_path) == 'HEAD'
+
+        # Refs in a reftable can't be read from files (git 2.45+ creates it with --ref-format=reftable)
+        (repo_path / '.git' / 'reftable').mkdir()
+        check(repo_path, hand_parsed=False)
+        check(worktree_path, hand_parsed=False)
+        git_ops.pygit2 = org_pygit2
+        check(repo_path, hand_parsed=False)
+    finally:
+        git_ops.run_git, git_ops.pygit2 = org_run_git, org_pygit2
+        git_ops._git_dirs.clear()
+        git_ops._head_cache.clear()
+        git_ops._repositories.clear()
+        shutil.rmtree(worktree_path, ignore_errors=True)
+        teardown_test_repo(repo_path)
+
+    print("✓ Test passed: Reading Git Refs")
+
+
+def run_processor_tool_test():
+    """Check that processors are held to the respond tool they were offered."""
+    print("\n=== Test: Processor Respond Tool ===")
+
+    import tools
+
+    repo_path = setup_test_repo()
+    org_call_llm = tools.call_llm
+
+    class FakeMaca:
+        worktree_path = repo_path
+
+    def run(processor, tool_name):
+        tools.call_llm = lambda messages, **kwargs: processor_response(tool_name, 'done')
+        return tools.run_subprocessor(processor, FakeMaca())
+
+    set_cprint_callback(lambda text, end: None)
+    try:
+        read_only = {'model': 'tiny', 'assignment': 'Summarize'}
+        writing = {'model': 'tiny', 'assignment': 'Fix', 'file_write_allow_globs': ['*.md']}
+        assert run(read_only, 'subprocessor_respond_no_updates') == 'done'
+        assert run(writing, 'subprocessor_respond') == 'done'
+        result = run(read_only, 'subprocessor_respond')
+        assert result == "Error: Processor called subprocessor_respond instead of subprocessor_respond_no_updates", result
+        assert run(writing, 'respond').startswith("Error: Processor called respond instead of subprocessor_respond")
+    finally:
+        tools.call_llm = org_call_llm
+        set_cprint_callback(None)
+        teardown_test_repo(repo_path)
+
+    print("✓ Test passed: Processor Respond Tool")
+
+
+# Tests of individual components, run before the TEST_CASES sessions
+UNIT_TESTS = [
+    run_history_trim_test,
+    run_shell_before_processors_test,
+    run_processor_tool_test,
+    run_dropped_connection_test,
+    run_prewarm_test,
+    run_container_recovery_test,
+    run_stream_reader_test,
+    run_output_lines_test,
+    run_compute_diff_test,
+    run_git_refs_test,
+]
+
+
 def run_all_tests():
     """Run all integration tests."""
     print("Starting MACA integration tests...")
@@ -250,6 +802,18 @@ def run_all_tests():
     passed = 0
     failed = 0
 
+    # These run first, as a non-interactive session exits the process when its task is done
+    for test in UNIT_TESTS:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"✗ Test failed: {test.__name__}")
+            print(f"  Error: {e}")
+            import traceback
+            traceback.print_exc()
+            failed += 1
+
     for test_case in TEST_CASES:
         try:
             run_test_case(test_case)
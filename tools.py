@@ -1,18 +1,19 @@
 #!/usr/bin/env python3
 """Tool system with single respond tool and processor support."""
 
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
 from prompt_toolkit import prompt as pt_prompt
 from prompt_toolkit.shortcuts import choice
 from typing import get_type_hints, get_origin, get_args, Any, Dict, List, Union, Optional, TypedDict
 import inspect
-import json
+import io
 import re
 import fnmatch
 
-from utils import cprint, get_matching_files, C_GOOD, C_BAD, C_NORMAL, C_IMPORTANT, C_INFO
-from llm import call_llm
+from utils import cprint, get_matching_files, json_dumps, json_loads, read_prompt, read_text_cached, C_GOOD, C_BAD, C_NORMAL, C_IMPORTANT, C_INFO
+from llm import call_llm, with_cache_control, CACHE_CONTROL_MODELS
 from docker_ops import run_in_container
 import git_ops
 
@@ -26,6 +27,12 @@ MODELS = {
     'huge': 'anthropic/claude-opus-4.1'
 }
 
+# Maximum number of sub-processors running (and waiting for the LLM) at the same time. Processors
+# spend nearly all their time waiting on the network, so this is bounded by provider rate limits
+# rather than local resources. It matches llm.MAX_IDLE_CONNECTIONS, so every worker's connection
+# can be kept for the next batch.
+MAX_PARALLEL_PROCESSORS = 8
+
 
 def check_path(path: str, worktree_path: Path) -> Path:
     """
@@ -500,23 +507,21 @@ def read_files(file_specs: List[FileRead], worktree_path: Path) -> List[str]:
         full_path = check_path(file_path, worktree_path)
 
         if not full_path.exists():
-            contents.append(f"File: {file_path}\n\nError: File not found")
+            contents[file_path] = {"error": "File not found"}
             continue
 
         try:
-            with open(full_path, 'r') as f:
-                lines = f.readlines()
-
+            # The main loop tends to reread the same files, and concurrent processors are often given the same ones
+            text = read_text_cached(full_path)
             # Handle line range
             if start_line is not None or end_line is not None:
+                lines = io.StringIO(text).readlines()
                 start_idx = (start_line - 1) if start_line else 0
                 end_idx = end_line if end_line else len(lines)
-                selected_lines = lines[start_idx:end_idx]
-                data = ''.join(selected_lines)
+                data = ''.join(lines[start_idx:end_idx])
                 contents[file_path] = {"data": data, "lines": f"{start_idx + 1}-{end_idx}"}
             else:
-                data = ''.join(lines)
-                contents[file_path] = {"data": data}
+                contents[file_path] = {"data": text}
         except Exception as e:
             contents[file_path] = {"error": str(e)}
 
@@ -562,14 +567,13 @@ def ask_questions(questions: List[Question], maca) -> None:
         maca.add_message({'role': 'user', 'content': answer})
 
 
-def run_subprocessor(processor: SubProcessor, maca, system_prompt: str) -> str:
+def run_subprocessor(processor: SubProcessor, maca) -> str:
     """
     Execute a processor in its own context.
 
     Args:
         processor: Processor specification
         maca: MACA instance
-        subprompt: System prompt for the processor
 
     Returns:
         The result from the processor's respond call
@@ -590,40 +594,44 @@ def run_subprocessor(processor: SubProcessor, maca, system_prompt: str) -> str:
     prompt = f"# Assignment\n\n{assignment}"
 
     if file_write_allow_globs:
-        prompt = prompt + "\n\n# Allowed globs for update_files:\n\n" + json.dumps(file_write_allow_globs) 
+        prompt = prompt + "\n\n# Allowed globs for update_files:\n\n" + json_dumps(file_write_allow_globs) 
 
     # Read files if specified
     if file_reads_specs:
-        prompt = "# Files\n\n" + json.dumps(read_files(file_reads_specs, maca.worktree_path)) + "\n\n" + prompt
+        prompt = "# Files\n\n" + json_dumps(read_files(file_reads_specs, maca.worktree_path)) + "\n\n" + prompt
 
     # Add assignment and data to processor context
     messages = [
-        {'role': 'system', 'content': system_prompt},
+        SUBPROCESSOR_CACHED_SYSTEM_MESSAGE if resolved_model.startswith(CACHE_CONTROL_MODELS) else SUBPROCESSOR_SYSTEM_MESSAGE,
         {'role': 'user', 'content': prompt},
     ]
 
+    # Processors that may not write files are offered a tool without file_updates
+    respond_tool = subprocessor_respond if file_write_allow_globs else subprocessor_respond_no_updates
+
     # Call LLM for processor
     try:
         llm_result = call_llm(
             model=resolved_model,
             messages=messages,
-            tool_schemas=[SUBPROCESSOR_RESPOND_TOOL_SCHEMA if file_write_allow_globs else SUBPROCESSOR_RESPOND_NO_UPDATES_TOOL_SCHEMA],
+            tool_schemas=SUBPROCESSOR_RESPOND_TOOL_SCHEMAS if file_write_allow_globs else SUBPROCESSOR_RESPOND_NO_UPDATES_TOOL_SCHEMAS,
+            progress=False,  # Processors may run concurrently
         )
 
         message = llm_result['message']
 
         # Extract and execute tool call
-        tool_calls = message.get('tool_calls', [])
-        if not tool_calls:
+        try:
+            tool_call = message['tool_calls'][0]
+        except (KeyError, TypeError, IndexError):
             return "Error: Processor did not make a tool call"
 
-        tool_call = tool_calls[0]
         tool_name = tool_call['function']['name']
-        tool_args = json.loads(tool_call['function']['arguments'])
+        tool_args = json_loads(tool_call['function']['arguments'])
 
-        # Processor should call subprocessor_respond
-        if tool_name != 'subprocessor_respond':
-            return f"Error: Processor called {tool_name} instead of subprocessor_respond"
+        # Processor should call the subprocessor_respond variant it was offered
+        if tool_name != respond_tool.__name__:
+            return f"Error: Processor called {tool_name} instead of {respond_tool.__name__}"
 
         # Handle processor's file_updates if present (with write pattern validation)
         if 'file_updates' in tool_args and tool_args['file_updates']:
@@ -643,13 +651,13 @@ def run_subprocessor(processor: SubProcessor, maca, system_prompt: str) -> str:
                     'role': 'user',
                     'content': [{
                         'type': 'tool_result',
-                        'tool_use_id': tool_calls[0]['id'],
-                        'content': json.dumps({"file_update_errors": errors, "proceed": "Carefully retry just the rejected file updates"})
+                        'tool_use_id': tool_call['id'],
+                        'content': json_dumps({"file_update_errors": errors, "proceed": "Carefully retry just the rejected file updates"})
                     }]
                 })
 
             if errors:
-                return json.dumps(errors)
+                return json_dumps(errors)
 
         # Return the result
         return tool_args.get('result', '')
@@ -658,6 +666,34 @@ def run_subprocessor(processor: SubProcessor, maca, system_prompt: str) -> str:
         return f"Error: Processor execution failed: {str(e)}"
 
 
+def run_subprocessors(sub_processors: List[SubProcessor], maca) -> List[str]:
+    """
+    Execute sub-processors concurrently (up to MAX_PARALLEL_PROCESSORS at a time).
+
+    Args:
+        sub_processors: List of processor specifications
+        maca: MACA instance
+
+    Returns:
+        List of processor results
+    """
+    # Identical processor specs within one call are only executed once
+    futures_by_spec = {}
+    futures = []
+    with ThreadPoolExecutor(max_workers=MAX_PARALLEL_PROCESSORS) as executor:
+        for i, processor in enumerate(sub_processors):
+            key = json_dumps(processor, sort_keys=True)
+            if key in futures_by_spec:
+                cprint(C_INFO, f'  [{i + 1}/{len(sub_processors)}] Reusing result of identical processor')
+            else:
+                cprint(C_INFO, f'  [{i + 1}/{len(sub_processors)}] Executing processor')
+                futures_by_spec[key] = executor.submit(run_subprocessor, processor, maca)
+            futures.append(futures_by_spec[key])
+
+        # run_subprocessor reports failures as result strings, so this doesn't raise
+        return [future.result() for future in futures]
+
+
 def subprocessor_respond(
     thoughts: str,
     file_updates: Optional[List[FileUpdate]] = None,
@@ -797,26 +833,19 @@ def respond(
         response['shell_commands'] = execute_shell_commands(shell_commands, maca.worktree_path, maca.repo_root)
         done = False
 
-    # 6. Handle sub-processors
+    # 6. Handle sub-processors. These only start once the shell commands are done, as those may write
+    # files that the processors read (or the other way around).
     if sub_processors:
-        # Load subprompt
-        script_dir = Path(__file__).parent
-        subprompt_path = script_dir / 'subprompt.md'
-        subprompt = subprompt_path.read_text()
-
-        processor_results = []
-        for i, processor in enumerate(sub_processors):
-            cprint(C_INFO, f'  [{i + 1}/{len(sub_processors)}] Executing processor')
-            result = run_subprocessor(processor, maca, subprompt)
-            processor_results.append(result)
-
-        response['sub_processors'] = processor_results
+        response['sub_processors'] = run_subprocessors(sub_processors, maca)
         done = False
 
     # Commit changes if files were updated
-    if maca.last_head_commit != git_ops.get_head_commit(maca.worktree_path):
-        git_ops.commit_changes(maca.worktree_path, f"MACA: {file_change_description or 'No description'}")
-        maca.last_head_commit = git_ops.get_head_commit(maca.worktree_path)
+    head_commit = git_ops.get_head_commit(maca.worktree_path)
+    if maca.last_head_commit != head_commit:
+        # HEAD only needs to be looked up again if the commit actually went through
+        if git_ops.commit_changes(maca.worktree_path, f"MACA: {file_change_description or 'No description'}"):
+            head_commit = git_ops.get_head_commit(maca.worktree_path)
+        maca.last_head_commit = head_commit
 
     # 9. Handle commit_message (merge to main if requested)
     if commit_message and done:
@@ -844,7 +873,7 @@ def respond(
                 "error": f"Merge conflict while rebasing. Please resolve merge conflicts by reading the affected files and using file_updates to resolve the conflicts. Then use a shell_command to run `git add <filename>.. && git rebase --continue`, before trying again with another commit_message. Here is the rebase output:\n\n{conflict}"
             }
             # Add error as user message so the assistant can fix it
-            maca.add_message({"role": "user", "content": json.dumps(error_response, indent=2)})
+            maca.add_message({"role": "user", "content": json_dumps(error_response, indent=True)})
             return (response, False)
 
         maca.add_message({"role": "user", "content": "Squashed and merged into main! You're now working on a fresh feature branch."})
@@ -870,3 +899,17 @@ def respond(
 RESPOND_TOOL_SCHEMA = generate_tool_schema(respond)
 SUBPROCESSOR_RESPOND_TOOL_SCHEMA = generate_tool_schema(subprocessor_respond)
 SUBPROCESSOR_RESPOND_NO_UPDATES_TOOL_SCHEMA = generate_tool_schema(subprocessor_respond_no_updates)
+
+# The system message that starts every processor context, read and built once at import. The subprompt
+# is shared by all processors, so for models that need explicit breakpoints (CACHE_CONTROL_MODELS) a
+# copy marked for the prompt cache is sent instead.
+SUBPROCESSOR_SYSTEM_MESSAGE = {
+    'role': 'system',
+    'content': read_prompt('subprompt.md')
+}
+SUBPROCESSOR_CACHED_SYSTEM_MESSAGE = with_cache_control(SUBPROCESSOR_SYSTEM_MESSAGE)
+
+# Tool schema lists as passed to call_llm, built once rather than per call
+RESPOND_TOOL_SCHEMAS = [RESPOND_TOOL_SCHEMA]
+SUBPROCESSOR_RESPOND_TOOL_SCHEMAS = [SUBPROCESSOR_RESPOND_TOOL_SCHEMA]
+SUBPROCESSOR_RESPOND_NO_UPDATES_TOOL_SCHEMAS = [SUBPROCESSOR_RESPOND_NO_UPDATES_TOOL_SCHEMA]
@@ -1,12 +1,29 @@
 """Utility functions for MACA."""
 
+from collections import OrderedDict
 from dataclasses import dataclass
+import difflib
+import functools
+import json
+import re
+import threading
+import time
 from prompt_toolkit import print_formatted_text
 from prompt_toolkit.formatted_text import FormattedText
 from pathlib import Path
 from fnmatch import fnmatch
 from typing import List, Dict, Any, Optional, Union
 
+try:
+    import orjson
+except ImportError:
+    orjson = None  # Fall back to the (slower) stdlib json module
+
+try:
+    import pygit2
+except ImportError:
+    pygit2 = None  # Fall back to difflib for computing diffs
+
 
 # Debug/testing support
 _cprint_callback = None
@@ -61,6 +78,89 @@ def cprint(*args, end='\n'):
         print_formatted_text(FormattedText(formatted_parts), end=end)
 
 
+def json_dumps_bytes(value: Any) -> bytes:
+    """Serialize a value to compact UTF-8 encoded JSON, using orjson when available."""
+    if orjson:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def json_dumps(value: Any, sort_keys: bool = False, indent: bool = False) -> str:
+    """Serialize a value to a JSON string (compact, or indented by 2 spaces), using orjson when available."""
+    if orjson:
+        option = (orjson.OPT_SORT_KEYS if sort_keys else 0) | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(value, option=option).decode('utf-8')
+    if indent:
+        return json.dumps(value, indent=2, ensure_ascii=False, sort_keys=sort_keys)
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False, sort_keys=sort_keys)
+
+
+def json_loads(data: Union[str, bytes]) -> Any:
+    """
+    Parse JSON from a str or bytes, using orjson when available.
+
+    Raises json.JSONDecodeError on invalid input (orjson's error type is a subclass of it).
+    """
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+@functools.cache
+def read_prompt(name: str) -> str:
+    """
+    Read a prompt file that lives next to the scripts.
+
+    Prompts don't change while MACA runs, so each one is only read from disk once.
+    """
+    return (Path(__file__).parent / name).read_text()
+
+
+# Text of files read through read_text_cached by path, along with the (mtime, size) it was read at.
+# Least recently used entries are evicted once the cached texts exceed TEXT_CACHE_MAX_SIZE characters
+# in total, so reading through a large repository doesn't keep all of it in memory.
+TEXT_CACHE_MAX_SIZE = 8_000_000
+_text_cache: OrderedDict[str, tuple] = OrderedDict()
+_text_cache_size = 0
+_text_cache_lock = threading.Lock()
+
+# Parsed gitignore files by path, along with the text they were parsed from (the least recently
+# used beyond GITIGNORE_CACHE_SIZE are evicted, like their texts in _text_cache)
+GITIGNORE_CACHE_SIZE = 16
+_gitignore_matchers: OrderedDict[str, tuple] = OrderedDict()
+
+
+def read_text_cached(path: Path) -> str:
+    """
+    Read a text file, reusing the previous read of it while its mtime and size are unchanged.
+
+    While unchanged, the same string object is returned, so callers can tell cheaply whether it
+    changed. Raises OSError (e.g. FileNotFoundError) like Path.read_text.
+    """
+    global _text_cache_size
+    key = str(path)
+    st = path.stat()
+    signature = (st.st_mtime_ns, st.st_size)
+    with _text_cache_lock:
+        cached = _text_cache.get(key)
+        if cached and cached[0] == signature:
+            _text_cache.move_to_end(key)
+            return cached[1]
+    text = path.read_text()
+    # As file timestamps are coarse, a file modified just now could change again without its mtime
+    # changing. Only cache files that have been left alone for a while.
+    if time.time_ns() - st.st_mtime_ns > 1_000_000_000 and len(text) <= TEXT_CACHE_MAX_SIZE // 4:
+        with _text_cache_lock:
+            cached = _text_cache.pop(key, None)
+            if cached:
+                _text_cache_size -= len(cached[1])
+            _text_cache[key] = (signature, text)
+            _text_cache_size += len(text)
+            while _text_cache_size > TEXT_CACHE_MAX_SIZE:
+                _text_cache_size -= len(_text_cache.popitem(last=False)[1][1])
+    return text
+
+
 class GitignoreMatcher:
     """Matcher for gitignore-style patterns."""
     
@@ -148,15 +248,64 @@ def parse_gitignore(gitignore_path: Path) -> GitignoreMatcher:
     Returns:
         GitignoreMatcher instance
     """
-    if not gitignore_path.exists():
-        return GitignoreMatcher([])
-    
     try:
-        patterns = gitignore_path.read_text().splitlines()
-        return GitignoreMatcher(patterns)
+        text = read_text_cached(gitignore_path)
     except Exception:
         return GitignoreMatcher([])
 
+    # Only parse the file again when it changed
+    key = str(gitignore_path)
+    with _text_cache_lock:
+        cached = _gitignore_matchers.get(key)
+        if cached and cached[0] is text:
+            _gitignore_matchers.move_to_end(key)
+            return cached[1]
+    matcher = GitignoreMatcher(text.splitlines())
+    with _text_cache_lock:
+        _gitignore_matchers[key] = (text, matcher)
+        _gitignore_matchers.move_to_end(key)
+        if len(_gitignore_matchers) > GITIGNORE_CACHE_SIZE:
+            _gitignore_matchers.popitem(last=False)
+    return matcher
+
+
+# Context lines around each change in diffs (the unified diff default)
+DIFF_CONTEXT_LINES = 3
+_HUNK_HEADER_RE = re.compile(r'^@@ -(\d+)(,\d+)? \+(\d+)(,\d+)? @@')
+
+
+def _offset_hunk_header(line: str, offset: int) -> str:
+    """Shift the line numbers in a unified diff hunk header by offset."""
+    m = _HUNK_HEADER_RE.match(line)
+    return f'@@ -{int(m[1]) + offset}{m[2] or ""} +{int(m[3]) + offset}{m[4] or ""} @@' + line[m.end():]
+
+
+def _format_hunk_range(start: int, count: int) -> str:
+    """Format a hunk header line range the way difflib does."""
+    return str(start) if count == 1 else f'{start},{count}'
+
+
+def _compute_libgit2_diff(old_text: str, new_text: str) -> Optional[str]:
+    """Compute a unified diff with libgit2's (C) diff implementation, formatted like compute_diff's difflib output."""
+    patch = pygit2.Patch.create_from(old_text, new_text, flag=pygit2.enums.DiffOption.FORCE_TEXT, context_lines=DIFF_CONTEXT_LINES)
+    parts = ['--- +++ ']
+    for hunk in patch.hunks:
+        parts.append(f'@@ -{_format_hunk_range(hunk.old_start, hunk.old_lines)} +{_format_hunk_range(hunk.new_start, hunk.new_lines)} @@')
+        # Skip the "No newline at end of file" markers, which difflib doesn't produce
+        parts.extend(line.origin + line.content for line in hunk.lines if line.origin in ' -+')
+    return ''.join(parts) if len(parts) > 1 else None
+
+
+@functools.lru_cache(maxsize=4)
+def _split_lines(text: str) -> List[str]:
+    """
+    Split text into lines (keeping line ends), remembering the last few results.
+
+    The state texts are diffed against the text they were last diffed to, so the old text was
+    usually split before. The returned list is shared, so it must not be modified.
+    """
+    return text.splitlines(keepends=True)
+
 
 def compute_diff(old_text: str, new_text: str) -> Optional[str]:
     """
@@ -166,11 +315,30 @@ def compute_diff(old_text: str, new_text: str) -> Optional[str]:
     """
     if old_text == new_text:
         return None
-    
-    import difflib
-    old_lines = old_text.splitlines(keepends=True)
-    new_lines = new_text.splitlines(keepends=True)
-    diff = difflib.unified_diff(old_lines, new_lines, lineterm='')
+
+    if pygit2:
+        return _compute_libgit2_diff(old_text, new_text)
+
+    old_lines = _split_lines(old_text)
+    new_lines = _split_lines(new_text)
+
+    # difflib is slow on large inputs (like the code map), while changes tend to be local. So only
+    # the changed region is diffed, skipping the common head and tail. Some slack is left around it
+    # for context lines, and so that ambiguous changes (e.g. in repeated lines) align mostly as before.
+    limit = min(len(old_lines), len(new_lines))
+    start = 0
+    while start < limit and old_lines[start] == new_lines[start]:
+        start += 1
+    end = 0
+    while end < limit - start and old_lines[-1 - end] == new_lines[-1 - end]:
+        end += 1
+    start = max(0, start - 2 * DIFF_CONTEXT_LINES)
+    end = max(0, end - 2 * DIFF_CONTEXT_LINES)
+
+    diff = difflib.unified_diff(old_lines[start:len(old_lines) - end], new_lines[start:len(new_lines) - end], lineterm='', n=DIFF_CONTEXT_LINES)
+    if start:
+        # Hunk line numbers are relative to the diffed region
+        diff = (_offset_hunk_header(line, start) if line.startswith('@@') else line for line in diff)
     diff_text = ''.join(diff)
     
     return diff_text if diff_text else None
@@ -197,8 +365,6 @@ def get_matching_files(
     Returns:
         List of Path objects for matching files (not directories)
     """
-    from utils import parse_gitignore
-    
     worktree = Path(worktree_path)
 
     # Normalize include patterns